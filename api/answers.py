@@ -0,0 +1,78 @@
+from utils.answer_cache import answer_cache
+from utils.executors import run_blocking
+from utils.llm import gpt_chain, astream_gpt_chain
+from utils.user import USER_FILES, USER_FILTER_FILES, GUIDELINES
+
+NO_DATA = "No Data Found"
+
+
+def answer_scope(uuid) -> tuple:
+    """
+    What a session's answers depend on besides the question: its files, its file filter, the
+    guidelines version and the cache generation of the session.
+    """
+    return (tuple(USER_FILES.get(uuid) or ()), tuple(USER_FILTER_FILES.get(uuid) or ()),
+            GUIDELINES.get("version"), answer_cache.generation(uuid))
+
+
+async def lookup_answer(uuid, scope, query):
+    """
+    Looks a question up in the answer cache: the exact match inline, then the semantic match,
+    which embeds the question, on the "llm" pool like the query embeddings of `gpt_chain`
+    rather than behind ingestion on the "embed" worker.
+    """
+    cached = answer_cache.get_exact(uuid, scope, query)
+    if cached is not None:
+        return cached
+    return await run_blocking("llm", answer_cache.get, uuid, scope, query)
+
+
+async def get_answer(vector_store, query, uuid) -> str:
+    """
+    Answers a question from the answer cache, or with `gpt_chain` on a miss.
+
+    Parameters:
+    - vector_store (Qdrant_DB): The session's store.
+    - query (str): The user question.
+    - uuid (str): The session id.
+
+    Returns:
+    - str: The answer.
+    """
+    scope = answer_scope(uuid)
+    cached = await lookup_answer(uuid, scope, query)
+    if cached is not None:
+        return cached["answer"]
+
+    result = await run_blocking("llm", gpt_chain, vector_store.vector_store, query, vector_store.bm25_index, uuid)
+    if result != NO_DATA:
+        await run_blocking("llm", answer_cache.put, uuid, scope, query, {"answer": result, "metadata": None})
+    return result
+
+
+async def astream_answer(vector_store, query, uuid):
+    """
+    Streams the cached answer of a question in one token event, or the events of
+    `astream_gpt_chain` on a miss, caching the finished answer.
+    """
+    scope = answer_scope(uuid)
+    cached = await lookup_answer(uuid, scope, query)
+    if cached is not None:
+        yield "metadata", {**(cached["metadata"] or {"sources": {}, "tables": 0}), "cached": True}
+        yield "token", cached["answer"]
+        return
+
+    metadata = None
+    answer = []
+    async for event, data in astream_gpt_chain(vector_store.vector_store, query, vector_store.bm25_index, uuid):
+        if event == "metadata":
+            metadata = data
+        elif event == "revision":
+            answer = []
+        elif event == "token":
+            answer.append(data)
+        yield event, data
+
+    result = "".join(answer)
+    if result != NO_DATA:
+        await run_blocking("llm", answer_cache.put, uuid, scope, query, {"answer": result, "metadata": metadata})
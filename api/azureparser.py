@@ -1,23 +1,28 @@
 import io
-import requests
 import os
+from api.http_client import parser_client, log_parser_error
 from dotenv import load_dotenv
 load_dotenv()
 
 
 class InvoiceProcessor:
+    PARSER_VERSION = "azure-invoice-v1"
+
     def __init__(self, invoice_file):
         self.invoice_file = invoice_file
         self.fastapi_url =  os.getenv("INVOICE_PARSER")
 
-    def load_file_as_stream(self) -> io.BytesIO:
+    def load_file_as_stream(self):
         file_obj = self.invoice_file
         if isinstance(file_obj, list):
             if file_obj:
                 file_obj = file_obj[0]
             else:
                 raise ValueError("No file provided in general_file list.")
-        return io.BytesIO(file_obj.getvalue())
+        # Readable streams (BytesIO, mmap) are shared by reference instead of copied
+        if isinstance(file_obj, (bytes, bytearray, memoryview)):
+            return io.BytesIO(file_obj)
+        return file_obj
 
 
     def process_invoice(self):
@@ -26,30 +31,42 @@ class InvoiceProcessor:
             files = {
                 "file": ("document.pdf", file_stream, "application/pdf")  
             }
-            response = requests.post(self.fastapi_url, files=files)
-            response.raise_for_status()
+            response = parser_client.post(self.fastapi_url, files=files)
+            return response.json()
+        except Exception as e:
+            return log_parser_error(self.fastapi_url, e)
+
+    async def aprocess_invoice(self):
+        file_stream = self.load_file_as_stream()
+        try:
+            files = {
+                "file": ("document.pdf", file_stream, "application/pdf")  
+            }
+            response = await parser_client.apost(self.fastapi_url, files=files)
             return response.json()
         except Exception as e:
-            print(f"An error occurred: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response text: {e.response.text}")
-            return None
+            return log_parser_error(self.fastapi_url, e)
 
 
 
 class GeneralProcessor:
+    PARSER_VERSION = "azure-general-v1"
+
     def __init__(self, general_file):
         self.general_file = general_file
         self.fastapi_url = os.getenv("GENERAL_PARSER") 
 
-    def load_file_as_stream(self) -> io.BytesIO:
+    def load_file_as_stream(self):
         file_obj = self.general_file
         if isinstance(file_obj, list):
             if file_obj:
                 file_obj = file_obj[0]
             else:
                 raise ValueError("No file provided in general_file list.")
-        return io.BytesIO(file_obj.getvalue())
+        # Readable streams (BytesIO, mmap) are shared by reference instead of copied
+        if isinstance(file_obj, (bytes, bytearray, memoryview)):
+            return io.BytesIO(file_obj)
+        return file_obj
 
 
     def process_general(self):
@@ -58,11 +75,18 @@ class GeneralProcessor:
             files = {
                 "file": ("document.pdf", file_stream, "application/pdf")  
             }
-            response = requests.post(self.fastapi_url, files=files)
-            response.raise_for_status()
+            response = parser_client.post(self.fastapi_url, files=files)
+            return response.json()
+        except Exception as e:
+            return log_parser_error(self.fastapi_url, e)
+
+    async def aprocess_general(self):
+        file_stream = self.load_file_as_stream()
+        try:
+            files = {
+                "file": ("document.pdf", file_stream, "application/pdf")  
+            }
+            response = await parser_client.apost(self.fastapi_url, files=files)
             return response.json()
         except Exception as e:
-            print(f"An error occurred: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response text: {e.response.text}")
-            return None
\ No newline at end of file
+            return log_parser_error(self.fastapi_url, e)
\ No newline at end of file
@@ -0,0 +1,133 @@
+from api.llm_comparator import LLMComparator
+from utils.executors import run_blocking
+from utils.user import PROCESSED_DATA, COMPARISONS
+import asyncio
+import logging
+import os
+import traceback
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def comparison_key(user_data, mode) -> tuple:
+    """
+    Identifies a comparison by the content hashes of both documents and the comparison mode.
+    """
+    return user_data.get("lc_sha256"), user_data.get("invoice_sha256"), mode
+
+
+def comparison_ready(user_data) -> bool:
+    """
+    Whether the session holds parsed data for both an LC and an invoice. A parser call that
+    returned nothing leaves None in place of the data, which cannot be compared.
+    """
+    return bool(user_data) and user_data.get("lc_data") is not None and user_data.get("invoice_data") is not None
+
+
+def log_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        error = task.exception()
+        logging.error(f"Error while Comparing Documents: {error} "
+                      f"trace_back:{''.join(traceback.format_exception(type(error), error, error.__traceback__))}")
+
+
+def start_comparison(uuid, mode=None) -> asyncio.Task:
+    """
+    Returns the comparison task of the session's current LC and invoice, starting it when no
+    task exists for these documents. A task for documents that were replaced since is
+    cancelled, so a stale result is never returned.
+
+    Parameters:
+    - uuid (str): The session id.
+    - mode (str): Comparison mode, COMPARISON_MODE by default.
+
+    Returns:
+    - asyncio.Task: Resolves to the result of `LLMComparator.compare_documents`.
+    """
+    user_data = PROCESSED_DATA[uuid]
+    comparator = LLMComparator(mode)
+    key = comparison_key(user_data, comparator.mode)
+
+    tasks = COMPARISONS.setdefault(uuid, {})
+    for other_key in [other_key for other_key in tasks if other_key[:2] != key[:2]]:
+        tasks.pop(other_key).cancel()
+
+    task = tasks.get(key)
+    if task is None or task.cancelled() or (task.done() and task.exception() is not None):
+        logging.info(f"Starting {comparator.mode} comparison for {uuid}")
+        task = asyncio.ensure_future(run_blocking("llm", comparator.compare_documents,
+                                                  user_data["lc_data"], user_data["invoice_data"]))
+        task.add_done_callback(log_failure)
+        tasks[key] = task
+    return tasks[key]
+
+
+def precompute_comparison(uuid):
+    """
+    Starts the comparison in the background once the session holds both an LC and an invoice,
+    so /compare_documents/ usually finds it done. Disabled with COMPARISON_PRECOMPUTE=false.
+    """
+    user_data = PROCESSED_DATA.get(uuid) or {}
+    if os.getenv("COMPARISON_PRECOMPUTE", "true").lower() != "true":
+        return
+    if comparison_ready(user_data):
+        start_comparison(uuid)
+
+
+async def get_comparison(uuid, mode=None) -> dict:
+    """
+    Returns the comparison of the session's documents, awaiting the precomputed one when it
+    is still running.
+    """
+    task = start_comparison(uuid, mode)
+    try:
+        # Shielded, a client that disconnects does not cancel the shared comparison
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise
+        # The documents were replaced while waiting, compare the current ones
+        return await asyncio.shield(start_comparison(uuid, mode))
+
+
+async def astream_comparison(uuid, mode=None):
+    """
+    Streams the comparison of the session's documents as (event, data) pairs.
+
+    A precomputed comparison, finished or still running, is awaited and sent whole, so the
+    background work is not repeated. Otherwise the assessment is streamed from the LLM and the
+    run is registered in COMPARISONS, where /compare_documents/ and later streams reuse it.
+    """
+    user_data = PROCESSED_DATA[uuid]
+    comparator = LLMComparator(mode)
+    key = comparison_key(user_data, comparator.mode)
+    tasks = COMPARISONS.setdefault(uuid, {})
+    task = tasks.get(key)
+
+    if task is not None and not task.cancelled() and not (task.done() and task.exception() is not None):
+        result = await get_comparison(uuid, mode)
+        yield "metadata", {"mode": result["mode"], "fields": result["fields"], "summary": result["summary"]}
+        yield "token", result["assessment"]
+        return
+
+    streamed = asyncio.get_running_loop().create_future()
+    streamed.add_done_callback(log_failure)
+    tasks[key] = streamed
+    result = {"mode": comparator.mode, "fields": [], "summary": {}, "assessment": ""}
+    try:
+        async for event, data in comparator.astream_compare(user_data["lc_data"], user_data["invoice_data"]):
+            if event == "metadata":
+                result.update(data)
+            elif event == "token":
+                result["assessment"] += data
+            yield event, data
+    except BaseException as e:
+        # Cancelled or disconnected streams are restarted by the next request, failures are kept
+        if not streamed.done():
+            if isinstance(e, Exception):
+                streamed.set_exception(e)
+            else:
+                streamed.cancel()
+        raise
+    if not streamed.done():
+        streamed.set_result(result)
@@ -0,0 +1,214 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+import requests
+import httpx
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import traceback
+from dotenv import load_dotenv
+load_dotenv()
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ParserClient:
+    """
+    Shared keep-alive HTTP client for the GENERAL_PARSER and INVOICE_PARSER services.
+
+    Keeps one pooled requests.Session for synchronous callers and one httpx.AsyncClient for
+    async callers, applies connect/read timeouts, and retries 429/5xx responses and connection
+    errors with jittered exponential backoff, honoring Retry-After when the server sends it.
+
+    Attributes:
+    - stats: Request, retry and pool usage counters.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=120.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=30.0):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.async_client = None
+
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "failures": 0, "retry_after_waits": 0,
+                      "in_flight": 0, "max_in_flight": 0, "total_seconds": 0.0, "status_codes": {}}
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        if self.async_client is None:
+            self.async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+        return self.async_client
+
+    def retry_delay(self, attempt, retry_after=None) -> float:
+        """
+        Returns how long to wait before the next attempt.
+
+        Parameters:
+        - attempt (int): Zero based number of the failed attempt.
+        - retry_after (str): Value of the Retry-After header, in seconds or as an HTTP date.
+
+        Returns:
+        - float: Seconds to wait, capped at `backoff_max`.
+        """
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                self.record(retry_after_waits=1)
+                return min(max(delay, 0.0), self.backoff_max)
+
+        # Full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def record(self, **counters):
+        with self.lock:
+            for key, value in counters.items():
+                self.stats[key] += value
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def record_status(self, status_code):
+        with self.lock:
+            self.stats["status_codes"][status_code] = self.stats["status_codes"].get(status_code, 0) + 1
+
+    def log_retry(self, url, attempt, reason):
+        self.record(retries=1)
+        logging.warning(f"Retrying {url} after attempt {attempt + 1} of {self.max_retries + 1}: {reason}")
+
+    @staticmethod
+    def rewind(files):
+        for value in (files or {}).values():
+            stream = value[1] if isinstance(value, tuple) else value
+            if hasattr(stream, "seek"):
+                stream.seek(0)
+
+    def post(self, url, files=None, **kwargs) -> requests.Response:
+        """
+        Sends a POST through the pooled requests.Session with timeouts and retries.
+
+        Returns:
+        - requests.Response: The successful response.
+        """
+        self.record(requests=1, in_flight=1)
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                self.rewind(files)
+                self.record(attempts=1)
+                try:
+                    response = self.session.post(url, files=files,
+                                                 timeout=(self.connect_timeout, self.read_timeout), **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt == self.max_retries:
+                        raise
+                    self.log_retry(url, attempt, e)
+                    time.sleep(self.retry_delay(attempt))
+                    continue
+
+                self.record_status(response.status_code)
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    self.log_retry(url, attempt, f"status {response.status_code}")
+                    time.sleep(self.retry_delay(attempt, response.headers.get("Retry-After")))
+                    continue
+
+                response.raise_for_status()
+                return response
+        except Exception:
+            self.record(failures=1)
+            raise
+        finally:
+            self.record(in_flight=-1, total_seconds=time.perf_counter() - start)
+
+    async def apost(self, url, files=None, **kwargs) -> httpx.Response:
+        """
+        Async variant of `post` backed by the shared httpx.AsyncClient.
+
+        Returns:
+        - httpx.Response: The successful response.
+        """
+        client = self.get_async_client()
+        self.record(requests=1, in_flight=1)
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                self.rewind(files)
+                self.record(attempts=1)
+                try:
+                    response = await client.post(url, files=files, **kwargs)
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    if attempt == self.max_retries:
+                        raise
+                    self.log_retry(url, attempt, e)
+                    await asyncio.sleep(self.retry_delay(attempt))
+                    continue
+
+                self.record_status(response.status_code)
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    self.log_retry(url, attempt, f"status {response.status_code}")
+                    await asyncio.sleep(self.retry_delay(attempt, response.headers.get("Retry-After")))
+                    continue
+
+                response.raise_for_status()
+                return response
+        except Exception:
+            self.record(failures=1)
+            raise
+        finally:
+            self.record(in_flight=-1, total_seconds=time.perf_counter() - start)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the retry counters and pool usage, used to size PARSER_POOL_SIZE.
+        """
+        with self.lock:
+            stats = {**self.stats, "status_codes": dict(self.stats["status_codes"])}
+        stats["pool_size"] = self.pool_size
+        stats["average_seconds"] = stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.aclose()
+            self.async_client = None
+        self.session.close()
+
+
+def log_parser_error(url, error):
+    """
+    Logs a failed parser call with the response text, when there is one; the parser
+    processors return its None result in place of the parsed document.
+    """
+    response = getattr(error, "response", None)
+    logging.error(f"Error while Calling {url}: {error} response:{response.text if response is not None else None} "
+                  f"trace_back:{traceback.format_exc()}")
+    return None
+
+
+parser_client = ParserClient(
+    pool_size=int(os.getenv("PARSER_POOL_SIZE", "10")),
+    connect_timeout=float(os.getenv("PARSER_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("PARSER_READ_TIMEOUT", "120")),
+    max_retries=int(os.getenv("PARSER_MAX_RETRIES", "3")),
+    backoff_base=float(os.getenv("PARSER_BACKOFF_BASE", "0.5")),
+    backoff_max=float(os.getenv("PARSER_BACKOFF_MAX", "30"))
+)
@@ -0,0 +1,214 @@
+from api.azureparser import GeneralProcessor, InvoiceProcessor
+from utils.executors import run_blocking
+from utils.parse_cache import parse_cache
+import asyncio
+import logging
+import os
+import traceback
+from dotenv import load_dotenv
+load_dotenv()
+
+# Windows parsed ahead of the embedding stage before the parser waits for it
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+# Chunks gathered from consecutive windows before they are embedded, by default the smallest
+# batch the embedding process pool shards, so windows of a few pages still use the pool
+PIPELINE_MIN_BATCH = int(os.getenv("PIPELINE_MIN_BATCH", os.getenv("EMBEDDING_POOL_MIN_BATCH", "64")))
+
+FILE_PROCESSORS = {
+    "Letter of Credit": (GeneralProcessor, "aprocess_general"),
+    "Invoice": (InvoiceProcessor, "aprocess_invoice"),
+}
+
+
+async def parse_remotely(processor, method_name, sha256, bypass_cache):
+    """
+    Returns the Azure result of a file from the parse cache, or calls the parser and caches it.
+    """
+    if not bypass_cache:
+        cached = await asyncio.to_thread(parse_cache.get, sha256, processor.PARSER_VERSION)
+        if cached is not None:
+            return cached
+
+    processed_data = await getattr(processor, method_name)()
+    await asyncio.to_thread(parse_cache.put, sha256, processor.PARSER_VERSION, processed_data)
+    return processed_data
+
+
+async def parse_locally(upload, document_generator, bypass_cache):
+    """
+    Returns the split documents and tables of a file from the parse cache, or parses it on the
+    local_parse executor and caches the result.
+    """
+    version = document_generator.parser_version
+    if not bypass_cache:
+        cached = await asyncio.to_thread(parse_cache.get, upload.sha256, version)
+        if cached is not None:
+            documents, tables = cached
+            return document_generator.rename_documents(documents, tables, upload.file_name)
+
+    documents, tables = await run_blocking("local_parse", document_generator.generate_documents,
+                                           file=upload.path, file_name=upload.file_name)
+    await asyncio.to_thread(parse_cache.put, upload.sha256, version, (documents, tables))
+    return documents, tables
+
+
+async def stream_locally(upload, document_generator, on_batch, bypass_cache):
+    """
+    Parses a file window by window and hands every window to `on_batch` as soon as it is
+    cleaned and split, so the first pages are embedded and searchable while later pages are
+    still being parsed.
+
+    Parsing runs ahead of `on_batch` by at most PIPELINE_QUEUE_SIZE windows: a window is only
+    started once a slot is free, so when the embedding stage falls behind the parser waits,
+    which keeps memory independent of the document size. The first window is handed over at
+    once, later ones are gathered until they hold PIPELINE_MIN_BATCH chunks. A cached parse
+    result is handed over as one batch.
+
+    Parameters:
+    - upload (SpooledUpload): The spooled PDF.
+    - document_generator (DocumentGenerator): Generator used for the local parse.
+    - on_batch (callable): Coroutine function called with (file_name, documents, tables).
+    - bypass_cache (bool): Parse again even when a cached result exists.
+
+    Returns:
+    - tuple: All split documents and the table index of the file.
+    """
+    version = document_generator.parser_version
+    if not bypass_cache:
+        cached = await asyncio.to_thread(parse_cache.get, upload.sha256, version)
+        if cached is not None:
+            documents, tables = document_generator.rename_documents(*cached, upload.file_name)
+            await on_batch(upload.file_name, documents, tables)
+            return documents, tables
+
+    windows = await run_blocking("local_parse", document_generator.plan_windows, upload.path)
+    queue = asyncio.Queue()
+    slots = asyncio.Semaphore(PIPELINE_QUEUE_SIZE)
+
+    async def produce():
+        try:
+            for window in windows:
+                await slots.acquire()
+                queue.put_nowait(asyncio.ensure_future(run_blocking(
+                    "local_parse", document_generator.generate_window, upload.path, upload.file_name, window)))
+        finally:
+            # Also ends the stream when the producer fails, the consumer then re-raises its error
+            queue.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    documents, tables = [], {}
+    batch_documents, batch_tables = [], {}
+    batches = 0
+    try:
+        while True:
+            window_task = await queue.get()
+            if window_task is None:
+                await producer
+                break
+            window_documents, window_tables = await window_task
+            slots.release()
+            documents.extend(window_documents)
+            tables.update(window_tables)
+            batch_documents.extend(window_documents)
+            batch_tables.update(window_tables)
+            if batches == 0 or len(batch_documents) >= PIPELINE_MIN_BATCH:
+                await on_batch(upload.file_name, batch_documents, batch_tables)
+                batch_documents, batch_tables = [], {}
+                batches += 1
+        if batch_documents or batch_tables:
+            await on_batch(upload.file_name, batch_documents, batch_tables)
+            batches += 1
+    except BaseException:
+        producer.cancel()
+        while not queue.empty():
+            window_task = queue.get_nowait()
+            if window_task is not None:
+                window_task.cancel()
+        raise
+
+    logging.info(f"Streamed {len(documents)} chunks of {upload.file_name} in {len(windows)} windows, "
+                 f"{batches} batches")
+    await asyncio.to_thread(parse_cache.put, upload.sha256, version, (documents, tables))
+    return documents, tables
+
+
+async def ingest_file(file_type, upload, document_generator, bypass_cache=False, on_batch=None) -> dict:
+    """
+    Runs the remote Azure parser call, on the shared async HTTP client, and the local parse
+    of one file concurrently. Both read the same spooled file: the upload streams from its
+    memory map and the local parser opens it by path. Results already in the parse cache for
+    the same content are reused unless `bypass_cache` is set.
+
+    With INGESTION_MODE=azure the page documents and tables are built from the Azure result
+    and the local parse only runs when that result has no layout.
+
+    When `on_batch` is given the local parse is streamed through it (see `stream_locally`),
+    and the Azure built documents are passed to it in one batch.
+
+    Parameters:
+    - file_type (str): "Letter of Credit" or "Invoice".
+    - upload (SpooledUpload): The spooled PDF.
+    - document_generator (DocumentGenerator): Generator used for the local parse.
+    - bypass_cache (bool): Parse again even when a cached result exists.
+    - on_batch (callable): Optional coroutine function called with (file_name, documents, tables).
+
+    Returns:
+    - dict: The Azure result, the split documents and the table index of the file.
+    """
+    processor_class, method_name = FILE_PROCESSORS[file_type]
+    processor = processor_class([upload.stream()])
+
+    def local_parse():
+        if on_batch is None:
+            return parse_locally(upload, document_generator, bypass_cache)
+        return stream_locally(upload, document_generator, on_batch, bypass_cache)
+
+    if os.getenv("INGESTION_MODE", "local") == "azure":
+        processed_data = await parse_remotely(processor, method_name, upload.sha256, bypass_cache)
+        documents, tables = await asyncio.to_thread(document_generator.generate_documents_from_azure,
+                                                    processed_data, upload.file_name)
+        if documents is None:
+            documents, tables = await local_parse()
+        elif on_batch is not None:
+            await on_batch(upload.file_name, documents, tables)
+    else:
+        remote = asyncio.ensure_future(parse_remotely(processor, method_name, upload.sha256, bypass_cache))
+        local = asyncio.ensure_future(local_parse())
+        try:
+            processed_data, (documents, tables) = await asyncio.gather(remote, local)
+        except BaseException:
+            # Stop streaming batches of a file that already failed
+            remote.cancel()
+            local.cancel()
+            raise
+
+    return {"file_name": upload.file_name, "sha256": upload.sha256, "processed_data": processed_data,
+            "documents": documents, "tables": tables}
+
+
+async def ingest_files(file_type, uploads, document_generator, bypass_cache=False, on_batch=None) -> list:
+    """
+    Ingests several files at once: every remote parser call is sent concurrently, bounded by
+    the parser client's connection pool, while the local parses run in the process pool.
+
+    Parameters:
+    - file_type (str): "Letter of Credit" or "Invoice".
+    - uploads (list): SpooledUpload objects.
+    - document_generator (DocumentGenerator): Generator used for the local parse.
+    - bypass_cache (bool): Parse again even when a cached result exists.
+    - on_batch (callable): Optional coroutine function receiving the streamed batches.
+
+    Returns:
+    - list: One result per upload in input order; a failed file yields its exception
+      instead of failing the whole batch.
+    """
+    results = await asyncio.gather(
+        *[ingest_file(file_type, upload, document_generator, bypass_cache, on_batch) for upload in uploads],
+        return_exceptions=True
+    )
+
+    for upload, result in zip(uploads, results):
+        if isinstance(result, BaseException):
+            logging.error(f"Error while Ingesting {upload.file_name}: {result} "
+                          f"trace_back:{''.join(traceback.format_exception(type(result), result, result.__traceback__))}")
+    return results
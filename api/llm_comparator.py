@@ -1,14 +1,58 @@
+import asyncio
+import copy
 import json
+import logging
+import os
+import time
 from dotenv import load_dotenv
 from langchain.schema import SystemMessage, HumanMessage
-from utils.prompts import DISCREPANCY_DETECTION_PROMPT
+from utils.prompts import (DISCREPANCY_DETECTION_PROMPT, RESIDUAL_COMPARISON_PROMPT, GROUP_COMPARISON_PROMPT,
+                           REDUCE_COMPARISON_PROMPT)
 from utils.azure_model import azure_openai
+from utils.field_matcher import (compare_fields, summarize, render_report, normalize_label, AMBIGUOUS, MISSING,
+                                 LC_FIELDS, INVOICE_FIELDS)
+from utils.prompt_compaction import compact_pair, count_tokens, field_items, fit_items, render_items, TOKEN_BUDGET
 
 load_dotenv()
 
+COMPARISON_MODES = ("hybrid", "offline", "llm", "map_reduce")
+
+# Field groups of the map_reduce mode, matched in order against the field paths; fields
+# matching none of them are documentary conditions
+FIELD_GROUPS = {
+    "goods description": ["goods", "description", "item", "product", "quantity", "unit", "hs code", "origin", "packing", "45a"],
+    "parties": ["beneficiary", "applicant", "vendor", "customer", "seller", "buyer", "consignee", "shipper", "notify", "bank", "59", "50"],
+    "dates and shipment": ["date", "expiry", "shipment", "shipping", "port", "loading", "discharge", "partial", "transhipment",
+                           "presentation", "period", "incoterm", "31d", "44"],
+    "amounts and currency": ["amount", "currency", "total", "tax", "price", "tolerance", "charges", "32b", "39a"],
+    "documentary conditions": [],
+}
+MAP_CONCURRENCY = int(os.getenv("COMPARISON_MAP_CONCURRENCY", "5"))
+
+# Labels of the LC and invoice fields a rule result is based on, sent to the LLM for the
+# fields the rules could not decide
+RESIDUAL_FIELD_LABELS = {
+    "currency": (LC_FIELDS["amount"] + ["currency"], INVOICE_FIELDS["amount"] + ["currency"]),
+    "amount": (LC_FIELDS["amount"] + LC_FIELDS["tolerance"], INVOICE_FIELDS["amount"]),
+    "beneficiary": (LC_FIELDS["beneficiary"], INVOICE_FIELDS["seller"]),
+    "applicant": (LC_FIELDS["applicant"], INVOICE_FIELDS["buyer"]),
+    "lc_number": (LC_FIELDS["lc_number"], ["lc number", "lc no", "credit number", "letter of credit", "reference",
+                                           "purchase order"]),
+    "expiry_date": (LC_FIELDS["expiry_date"], INVOICE_FIELDS["invoice_date"]),
+    "latest_shipment_date": (LC_FIELDS["latest_shipment_date"], INVOICE_FIELDS["shipment_date"]),
+    "incoterms": (["incoterm", "terms of delivery", "delivery terms", "price terms", "45a"],
+                  ["incoterm", "terms of delivery", "delivery terms", "shipping terms", "payment terms"]),
+}
+
+SYSTEM_PROMPT = "You are expert in reviewing financial documents, You have the compare letter of credit with the invoice"
+
 class LLMComparator:
-    def __init__(self):
+    def __init__(self, mode=None):
         self.llm = azure_openai
+        # "hybrid" checks fields with rules and sends only undecided fields to the LLM,
+        # "offline" never calls the LLM, "llm" sends both documents to the LLM and
+        # "map_reduce" compares field groups in parallel LLM calls
+        self.mode = mode or os.getenv("COMPARISON_MODE", "hybrid")
 
     def clean_data(self, data):
         if isinstance(data, dict):
@@ -43,23 +87,182 @@ class LLMComparator:
         else:
             return data
 
+    def messages(self, prompt) -> list:
+        return [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=prompt)]
 
-    def compare_documents(self, lc_response, invoice_response):
-        
-        cleaned_invoice_response = self.clean_data(invoice_response)
-        cleaned_lc_response = self.clean_data(lc_response)
-        
-        prompt = DISCREPANCY_DETECTION_PROMPT.format(
-            lc_response=json.dumps(cleaned_lc_response, indent=2),
-            invoice_response=json.dumps(cleaned_invoice_response, indent=2)
+    def invoke(self, prompt) -> str:
+        return self.llm.invoke(self.messages(prompt)).content
+
+    def log_compaction(self, lc_response, invoice_response, texts):
+        """
+        Logs the token count of the LC and invoice data before compaction (cleaned, indented
+        JSON) and of the document texts a comparison mode actually sends.
+        """
+        # clean_data edits in place, the session keeps the original responses
+        before = sum(count_tokens(json.dumps(self.clean_data(copy.deepcopy(response)), indent=2))
+                     for response in (lc_response, invoice_response))
+        after = sum(count_tokens(text) for text in texts)
+        logging.info(f"Comparison data ({self.mode}) compacted from {before} to {after} tokens")
+
+    def compact_documents(self, lc_response, invoice_response):
+        """
+        Returns the LC and invoice data compacted to the comparison token budget.
+        """
+        lc_text, invoice_text = compact_pair(lc_response, invoice_response)
+        self.log_compaction(lc_response, invoice_response, [lc_text, invoice_text])
+        return lc_text, invoice_text
+
+    def llm_prompt(self, lc_response, invoice_response) -> str:
+        lc_text, invoice_text = self.compact_documents(lc_response, invoice_response)
+        return DISCREPANCY_DETECTION_PROMPT.format(lc_response=lc_text, invoice_response=invoice_text)
+
+    def residual_items(self, response, labels) -> list:
+        """
+        Returns the extracted (path, value) items of a document whose path contains one of
+        `labels` as whole words.
+        """
+        labels = [f" {label} " for label in labels]
+        return [(path, value) for path, value in field_items(response)
+                if path != "content" and any(label in f" {normalize_label(path)} " for label in labels)]
+
+    def residual_prompt(self, fields, residual, lc_response, invoice_response) -> str:
+        """
+        Builds the hybrid prompt from the rule results and, for the fields the rules could not
+        decide only, the LC and invoice values they are based on.
+        """
+        lc_labels, invoice_labels = [], []
+        for field in residual:
+            lc_field_labels, invoice_field_labels = RESIDUAL_FIELD_LABELS.get(field["field"], ([], []))
+            lc_labels.extend(lc_field_labels)
+            invoice_labels.extend(invoice_field_labels)
+
+        budget = TOKEN_BUDGET // 4
+        lc_fields = render_items(fit_items(self.residual_items(lc_response, lc_labels), budget))
+        invoice_fields = render_items(fit_items(self.residual_items(invoice_response, invoice_labels), budget))
+        self.log_compaction(lc_response, invoice_response, [lc_fields, invoice_fields])
+        prompt = RESIDUAL_COMPARISON_PROMPT.format(
+            field_summary=render_report(fields),
+            residual_fields=json.dumps(residual, separators=(",", ":"), default=str),
+            lc_fields=lc_fields or "None",
+            invoice_fields=invoice_fields or "None"
         )
+        logging.info(f"Residual comparison prompt for {len(residual)} fields: {count_tokens(prompt)} tokens")
+        return prompt
 
-        response = self.llm.invoke([
-            SystemMessage(content="You are expert in reviewing financial documents, You have the compare letter of credit with the invoice"),
-            HumanMessage(content=prompt)
-        ])
-        
-        try:
-            return response.content
-        except json.JSONDecodeError:
-            return {"error": "Invalid JSON response from llm"}
\ No newline at end of file
+    def group_items(self, items) -> dict:
+        """
+        Assigns (path, value) items to the FIELD_GROUPS by keywords in their path.
+        """
+        groups = {group: [] for group in FIELD_GROUPS}
+        for path, value in items:
+            words = f" {normalize_label(path)} "
+            group = next((group for group, keywords in FIELD_GROUPS.items()
+                          if any(f" {keyword}" in words for keyword in keywords)), "documentary conditions")
+            groups[group].append((path, value))
+        return groups
+
+    def group_messages(self, lc_response, invoice_response):
+        """
+        Returns the non-empty field groups and the map prompt messages comparing each of them.
+        """
+        # The full document text is left out, the groups only carry extracted fields
+        lc_groups = self.group_items([item for item in field_items(lc_response) if item[0] != "content"])
+        invoice_groups = self.group_items([item for item in field_items(invoice_response) if item[0] != "content"])
+        group_budget = TOKEN_BUDGET // 2
+
+        groups = [group for group in FIELD_GROUPS if lc_groups[group] or invoice_groups[group]]
+        group_fields = [(render_items(fit_items(lc_groups[group], group_budget)),
+                         render_items(fit_items(invoice_groups[group], group_budget))) for group in groups]
+        self.log_compaction(lc_response, invoice_response, [text for pair in group_fields for text in pair])
+        messages = [self.messages(GROUP_COMPARISON_PROMPT.format(
+            group=group,
+            lc_fields=lc_fields or "None",
+            invoice_fields=invoice_fields or "None"
+        )) for group, (lc_fields, invoice_fields) in zip(groups, group_fields)]
+        return groups, messages
+
+    def reduce_prompt(self, fields, groups, responses) -> str:
+        group_findings = "\n\n".join(f"### {group}\n{response.content}" for group, response in zip(groups, responses))
+        return REDUCE_COMPARISON_PROMPT.format(field_summary=render_report(fields), group_findings=group_findings)
+
+    def map_reduce_assessment(self, fields, lc_response, invoice_response) -> str:
+        """
+        Compares every field group in its own LLM call, run concurrently, and merges the group
+        findings in a short reduce call, so latency follows the slowest group instead of the
+        size of the whole LC.
+        """
+        groups, messages = self.group_messages(lc_response, invoice_response)
+
+        start = time.perf_counter()
+        responses = self.llm.batch(messages, config={"max_concurrency": MAP_CONCURRENCY})
+        map_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assessment = self.invoke(self.reduce_prompt(fields, groups, responses))
+        logging.info(f"Map-reduce comparison of {len(groups)} groups: map {map_seconds:.2f}s, "
+                     f"reduce {time.perf_counter() - start:.2f}s")
+        return assessment
+
+    def compare_documents(self, lc_response, invoice_response) -> dict:
+        """
+        Compares a Letter of Credit with an Invoice.
+
+        Amounts, currency, party names, the LC number, dates and incoterms are checked by the
+        rule engine first. In hybrid mode only the fields it cannot decide go to the LLM, and
+        no LLM call is made when every field is decided; offline mode never calls the LLM.
+        map_reduce compares the field groups of long LCs in concurrent LLM calls and merges them.
+
+        Parameters:
+        - lc_response (dict): The Azure result of the Letter of Credit.
+        - invoice_response (dict): The Azure result of the Invoice.
+
+        Returns:
+        - dict: The mode, the per-field results, their counts per status and a markdown assessment.
+        """
+        if self.mode == "llm":
+            return {"mode": self.mode, "fields": [], "summary": {},
+                    "assessment": self.invoke(self.llm_prompt(lc_response, invoice_response))}
+
+        fields = compare_fields(lc_response, invoice_response)
+        residual = [field for field in fields if field["status"] in (AMBIGUOUS, MISSING)]
+
+        if self.mode == "map_reduce":
+            assessment = self.map_reduce_assessment(fields, lc_response, invoice_response)
+        elif self.mode == "offline" or not residual:
+            assessment = render_report(fields)
+        else:
+            assessment = self.invoke(self.residual_prompt(fields, residual, lc_response, invoice_response))
+
+        return {"mode": self.mode, "fields": fields, "summary": summarize(fields), "assessment": assessment}
+
+    async def astream_compare(self, lc_response, invoice_response):
+        """
+        Streaming variant of `compare_documents`: yields (event, data) pairs.
+
+        Events:
+        - metadata: the mode, the per-field results and their counts, sent before any LLM call.
+        - groups: the field groups compared by the map step of map_reduce, once it is done.
+        - token: a piece of the assessment, streamed from the final LLM call.
+        """
+        if self.mode == "llm":
+            yield "metadata", {"mode": self.mode, "fields": [], "summary": {}}
+            prompt = await asyncio.to_thread(self.llm_prompt, lc_response, invoice_response)
+        else:
+            fields = await asyncio.to_thread(compare_fields, lc_response, invoice_response)
+            residual = [field for field in fields if field["status"] in (AMBIGUOUS, MISSING)]
+            yield "metadata", {"mode": self.mode, "fields": fields, "summary": summarize(fields)}
+
+            if self.mode == "map_reduce":
+                groups, messages = await asyncio.to_thread(self.group_messages, lc_response, invoice_response)
+                responses = await self.llm.abatch(messages, config={"max_concurrency": MAP_CONCURRENCY})
+                yield "groups", groups
+                prompt = self.reduce_prompt(fields, groups, responses)
+            elif self.mode == "offline" or not residual:
+                yield "token", render_report(fields)
+                return
+            else:
+                prompt = await asyncio.to_thread(self.residual_prompt, fields, residual, lc_response, invoice_response)
+
+        async for chunk in self.llm.astream(self.messages(prompt)):
+            if chunk.content:
+                yield "token", chunk.content
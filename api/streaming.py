@@ -0,0 +1,37 @@
+import json
+import logging
+import time
+import traceback
+
+
+def sse_event(event, data) -> str:
+    """
+    Formats one server-sent event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_stream(events, name):
+    """
+    Forwards (event, data) pairs from an async generator as server-sent events, logs the time to
+    first token and ends with a `done` event carrying the timings, or an `error` event.
+
+    Parameters:
+    - events (AsyncIterator): Yields (event, data) pairs.
+    - name (str): Name of the stream in the logs.
+    """
+    start = time.perf_counter()
+    time_to_first_token = None
+    try:
+        async for event, data in events:
+            if event == "token" and time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+                logging.info(f"{name} time to first token {time_to_first_token:.2f}s")
+            yield sse_event(event, data)
+
+        total_seconds = time.perf_counter() - start
+        logging.info(f"{name} streamed in {total_seconds:.2f}s")
+        yield sse_event("done", {"time_to_first_token": time_to_first_token, "seconds": total_seconds})
+    except Exception as e:
+        logging.error(f"Error while Streaming {name}: {e} trace_back:{traceback.format_exc()}")
+        yield sse_event("error", {"detail": str(e)})
@@ -0,0 +1,154 @@
+from fastapi import HTTPException
+import hashlib
+import io
+import logging
+import mmap
+import os
+import tempfile
+from dotenv import load_dotenv
+load_dotenv()
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def max_upload_bytes() -> int:
+    return int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+
+
+class MappedStream(io.RawIOBase):
+    """
+    Seekable, read-only stream over a memoryview. Reads copy only the requested chunk, and
+    `seek` reports positions so HTTP clients can compute the multipart Content-Length.
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.closed:
+            raise ValueError("I/O operation on closed stream")
+        size = min(len(buffer), len(self.view) - self.position)
+        buffer[:size] = self.view[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.view)}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.view.release()
+        super().close()
+
+
+class SpooledUpload:
+    """
+    An uploaded PDF written once to a temporary file and shared by reference.
+
+    The local parser reads the file through `path`, and the remote parser upload streams the
+    same bytes from a read-only memory map of that file, so the PDF is never held as several
+    in-memory copies.
+
+    Attributes:
+    - file_name: Name of the file without extension.
+    - path: Path of the temporary file.
+    - sha256: Hex digest of the content, computed while spooling.
+    - size: Size in bytes.
+    """
+
+    def __init__(self, file_name, path, sha256, size):
+        self.file_name = file_name
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.file = None
+        self.mapping = None
+        self.streams = []
+
+    def buffer(self) -> memoryview:
+        """
+        Returns a memoryview over a read-only memory map of the file.
+        """
+        if self.mapping is None:
+            self.file = open(self.path, "rb")
+            self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.mapping)
+
+    def stream(self) -> MappedStream:
+        """
+        Returns a file-like stream over the memory map, usable as a multipart upload.
+        """
+        stream = MappedStream(self.buffer())
+        self.streams.append(stream)
+        return stream
+
+    def close(self):
+        for stream in self.streams:
+            stream.close()
+        self.streams.clear()
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def spool_upload(upload, max_bytes=None) -> SpooledUpload:
+    """
+    Streams an UploadFile in chunks into a temporary file, hashing it on the fly.
+
+    Parameters:
+    - upload (UploadFile): The incoming file.
+    - max_bytes (int): Size limit, MAX_UPLOAD_MB by default.
+
+    Returns:
+    - SpooledUpload: The spooled file.
+
+    Raises:
+    - HTTPException: 413 when the file is larger than the limit, 400 when it is empty.
+    """
+    max_bytes = max_bytes or max_upload_bytes()
+    file_name = upload.filename.split('.')[0]
+
+    # Reject early when the client announced the size
+    if getattr(upload, "size", None) and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"{upload.filename} exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+    hasher = hashlib.sha256()
+    size = 0
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+    try:
+        with temp_file:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"{upload.filename} exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                hasher.update(chunk)
+                temp_file.write(chunk)
+
+        if not size:
+            raise HTTPException(status_code=400, detail=f"{upload.filename} is empty")
+
+    except Exception:
+        os.remove(temp_file.name)
+        raise
+
+    logging.info(f"Spooled {upload.filename} ({size} bytes)")
+    return SpooledUpload(file_name, temp_file.name, hasher.hexdigest(), size)
@@ -1,12 +1,23 @@
 from fastapi import FastAPI, File, UploadFile, Header, HTTPException, Response, status, Form
 from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from utils import (Qdrant_DB, EmbeddingModel, DocumentGenerator, gpt_chain, extract_guidlines)
+from fastapi.responses import StreamingResponse
+from utils import (Qdrant_DB, EmbeddingModel, DocumentGenerator, extract_guidlines)
+from utils.llm import get_query_stats
+from utils.guideline_index import GuidelineIndex
 from utils.user import VECTOR_STORES, USER_FILES, USER_FILTER_FILES, GUIDELINES, TABULAR_DATA, PROCESSED_DATA
-from api.azureparser import GeneralProcessor, InvoiceProcessor
-from api.llm_comparator import LLMComparator
-import tempfile, shutil, logging, string, traceback
-from io import BytesIO
+from api.ingestion import ingest_files, FILE_PROCESSORS
+from api.http_client import parser_client
+from api.uploads import spool_upload
+from utils.parse_cache import parse_cache
+from utils.answer_cache import answer_cache
+from utils.table_format import get_table_stats
+from api.answers import get_answer, astream_answer
+from api.llm_comparator import COMPARISON_MODES
+from api.comparisons import precompute_comparison, comparison_ready, get_comparison, astream_comparison
+from api.streaming import sse_stream
+from utils.executors import run_blocking, shutdown_executors
+import tempfile, shutil, logging, string, traceback, hashlib
 
 app = FastAPI()
 
@@ -25,37 +36,84 @@ app.add_middleware(
 )
 
 embedding_model = EmbeddingModel()
+answer_cache.embedding_model = embedding_model
 document_generator = DocumentGenerator()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_executors()
+    if EmbeddingModel.cache is not None:
+        EmbeddingModel.cache.close()
+    await parser_client.aclose()
+
 @app.post("/process_files/")
 async def process_files_endpoint(
+    response: Response,
     file_type: str = Form(...),
     files: List[UploadFile] = File(...),
+    bypass_cache: bool = Form(False),
     uuid: str = Header(...)
 ):
+    if file_type not in FILE_PROCESSORS:
+        raise HTTPException(status_code=400, detail="Invalid file type")
+
     processed_data = {}
-    docs = []
-    user_file_tables = []
     files_names = []
+    failed_files = []
 
-    for file in files:
-        file_bytes = await file.read()
-        file_stream = BytesIO(file_bytes)
-
-        file_name = file.filename.split('.')[0]
-        files_names.append(file_name)
-
-        # Process document (GeneralProcessor or InvoiceProcessor)
-        if file_type == "Letter of Credit":
-            processor = GeneralProcessor([file_stream])
-            processed_data = processor.process_general()
-
-        elif file_type == "Invoice":
-            processor = InvoiceProcessor([file_stream])
-            processed_data = processor.process_invoice()
+    collection_name = f"temp_{uuid}"
 
-        else:
-            raise HTTPException(status_code=400, detail="Invalid file type")
+    if uuid not in VECTOR_STORES:
+        VECTOR_STORES[uuid] = Qdrant_DB(embedding_model, collection_name)
+    qdrant = VECTOR_STORES[uuid]
+
+    # Table index keyed by (file_name, page_number)
+    table_index = TABULAR_DATA.setdefault(uuid, {})
+    indexed_files = set()
+
+    async def drop_file(file_name):
+        await run_blocking("embed", qdrant.delete_file, file_name)
+        for key in [key for key in table_index if key[0] == file_name]:
+            del table_index[key]
+        answer_cache.invalidate(uuid)
+
+    async def index_batch(file_name, documents, tables):
+        # Re-uploaded files replace their previous chunks instead of duplicating them
+        if file_name not in indexed_files:
+            indexed_files.add(file_name)
+            await drop_file(file_name)
+
+        # Every batch is searchable as soon as it is embedded, before the rest of the file is parsed
+        await run_blocking("embed", qdrant.add_documents, documents)
+        table_index.update(tables)
+        user_files = USER_FILES.setdefault(uuid, [])
+        if file_name not in user_files:
+            user_files.append(file_name)
+        # Answers given before this batch was searchable may be incomplete
+        answer_cache.invalidate(uuid)
+
+    uploads = []
+    try:
+        for file in files:
+            uploads.append(await spool_upload(file))
+        results = await ingest_files(file_type, uploads, document_generator, bypass_cache, on_batch=index_batch)
+    finally:
+        for upload in uploads:
+            upload.close()
+
+    for upload, result in zip(uploads, results):
+        if isinstance(result, BaseException):
+            failed_files.append(upload.file_name)
+            # Drop the batches a failed file already streamed into the session
+            if upload.file_name in indexed_files:
+                await drop_file(upload.file_name)
+                # A file whose first batch failed to embed was never registered
+                if upload.file_name in USER_FILES.get(uuid, []):
+                    USER_FILES[uuid].remove(upload.file_name)
+            continue
+
+        files_names.append(upload.file_name)
+        processed_data = result["processed_data"]
 
         # Save processed data in session state
         if uuid not in PROCESSED_DATA:
@@ -63,66 +121,61 @@ async def process_files_endpoint(
 
         if file_type == "Letter of Credit":
             PROCESSED_DATA[uuid]["lc_data"] = processed_data
+            PROCESSED_DATA[uuid]["lc_sha256"] = result["sha256"]
         elif file_type == "Invoice":
             PROCESSED_DATA[uuid]["invoice_data"] = processed_data
+            PROCESSED_DATA[uuid]["invoice_sha256"] = result["sha256"]
 
-        # Generate documents and prepare for vector storage
-        with tempfile.NamedTemporaryFile(delete=True) as temp_file:
-            temp_file.write(file_bytes)
-            temp_file.flush()
-
-            splitted_docs, tables_in_file = document_generator.generate_documents(
-                file=str(temp_file.name), file_name=file_name
-            )
+    if not files_names:
+        raise HTTPException(status_code=500, detail=f"Failed to process files: {', '.join(failed_files)}")
 
-            docs.extend(splitted_docs)
-            user_file_tables.extend(tables_in_file)
+    # Compare in the background as soon as both documents exist, replacing a stale comparison
+    precompute_comparison(uuid)
 
-    collection_name = f"temp_{uuid}"
-
-    if uuid in VECTOR_STORES:
-        existing_qdrant = VECTOR_STORES[uuid]
-        existing_docs = getattr(existing_qdrant, "documents", [])
-        combined_docs = existing_docs + docs
-
-        qdrant = Qdrant_DB(embedding_model, collection_name)
-        qdrant.upload_vectors(combined_docs)
-        VECTOR_STORES[uuid] = qdrant
-
-        USER_FILES[uuid] = USER_FILES.get(uuid, []) + files_names
-        TABULAR_DATA[uuid] = TABULAR_DATA.get(uuid, []) + user_file_tables
-    else:
-        qdrant = Qdrant_DB(embedding_model, collection_name)
-        qdrant.upload_vectors(docs)
-        VECTOR_STORES[uuid] = qdrant
-        USER_FILES[uuid] = files_names
-        TABULAR_DATA[uuid] = user_file_tables
+    if failed_files:
+        response.headers["X-Failed-Files"] = ",".join(failed_files)
 
     return processed_data
 
 @app.post("/compare_documents/")
-async def compare_documents_endpoint(uuid: str = Header(...)):
-    user_data = PROCESSED_DATA.get(uuid)
+async def compare_documents_endpoint(mode: Optional[str] = None, uuid: str = Header(...)):
+    if mode and mode not in COMPARISON_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode, use one of {', '.join(COMPARISON_MODES)}")
 
-    if not user_data or "lc_data" not in user_data or "invoice_data" not in user_data:
+    if not comparison_ready(PROCESSED_DATA.get(uuid)):
         raise HTTPException(status_code=400, detail="Both Letter of Credit and Invoice must be processed before comparison.")
 
-    lc_data = user_data["lc_data"]
-    invoice_data = user_data["invoice_data"]
+    return await get_comparison(uuid, mode)
 
-    comparator = LLMComparator()
-    result = comparator.compare_documents(lc_data, invoice_data)
+@app.post("/compare_documents/stream/")
+async def compare_documents_stream_endpoint(mode: Optional[str] = None, uuid: str = Header(...)):
+    if mode and mode not in COMPARISON_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode, use one of {', '.join(COMPARISON_MODES)}")
 
-    return result
+    if not comparison_ready(PROCESSED_DATA.get(uuid)):
+        raise HTTPException(status_code=400, detail="Both Letter of Credit and Invoice must be processed before comparison.")
+
+    return StreamingResponse(sse_stream(astream_comparison(uuid, mode), "Comparison"), media_type="text/event-stream")
 
 @app.post("/query/")
 async def query_endpoint(query: str, uuid: str = Header(...)):
     vector_store = VECTOR_STORES.get(uuid)
 
-    if vector_store:
+    # The session exists from the start of its first upload, its collection from the first embedded batch
+    if vector_store and vector_store.vector_store is not None:
         query = query.lower().translate(str.maketrans({key: f" {key} " for key in string.punctuation}))
-        result = gpt_chain(vector_store.vector_store, query, vector_store.documents, uuid)
-        return result
+        return await get_answer(vector_store, query, uuid)
+
+    raise HTTPException(status_code=404, detail="User session not found.")
+
+@app.post("/query/stream/")
+async def query_stream_endpoint(query: str, uuid: str = Header(...)):
+    vector_store = VECTOR_STORES.get(uuid)
+
+    if vector_store and vector_store.vector_store is not None:
+        query = query.lower().translate(str.maketrans({key: f" {key} " for key in string.punctuation}))
+        events = astream_answer(vector_store, query, uuid)
+        return StreamingResponse(sse_stream(events, "Query"), media_type="text/event-stream")
 
     raise HTTPException(status_code=404, detail="User session not found.")
 
@@ -130,6 +183,8 @@ async def query_endpoint(query: str, uuid: str = Header(...)):
 async def clean_db_endpoint(uuid: str = Header(...)):
     if uuid in VECTOR_STORES:
         del VECTOR_STORES[uuid]
+        TABULAR_DATA.pop(uuid, None)
+        answer_cache.invalidate(uuid)
         return Response("User Deleted", status_code=200)
 
     raise HTTPException(status_code=404, detail="User not found.")
@@ -142,20 +197,30 @@ async def gpt_guidelines(file: Optional[UploadFile] = File(None), text: Optional
     guidelines = ""
 
     if file:
+        file_type = file.filename.split('.')[-1]
+        # Validated here because HTTPException cannot travel back from the parse worker process
+        if file_type != "pdf":
+            raise HTTPException(status_code=422, detail="File Type is not valid ")
+
         with tempfile.NamedTemporaryFile(delete=True) as temp_file:
             shutil.copyfileobj(file.file, temp_file)
-            file_type = file.filename.split('.')[-1]
-            guidelines = extract_guidlines(temp_file.name, file_type)
+            temp_file.flush()
+            guidelines = await run_blocking("local_parse", extract_guidlines, temp_file.name, file_type)
 
     if text:
         guidelines += f"\n{text}"
 
+    index = await run_blocking("embed", GuidelineIndex, guidelines, embedding_model)
     GUIDELINES["guidelines"] = guidelines
+    GUIDELINES["index"] = index
+    GUIDELINES["version"] = hashlib.sha256(guidelines.encode("utf-8")).hexdigest()
+    answer_cache.invalidate()
     return Response("Guidelines Updated Successfully", status_code=200)
 
 @app.post("/clear_guidelines/")
 def clear_guidelines_endpoint():
     GUIDELINES.clear()
+    answer_cache.invalidate()
     return Response("Guidelines Cleared Successfully", status_code=200)
 
 @app.get("/get_files_names/")
@@ -178,8 +243,20 @@ def choose_file_endpoint(files_selected: Optional[List[str]] = None, uuid: str =
                 raise HTTPException(status_code=400, detail=f"Invalid file: {file}")
 
     USER_FILTER_FILES[uuid] = files_selected
+    answer_cache.invalidate(uuid)
     return Response("Filter Applied Successfully", status_code=200)
 
+@app.get("/stats/")
+def stats_endpoint():
+    stats = {"parser_client": parser_client.get_stats(), "parse_cache": parse_cache.get_stats(),
+             "queries": get_query_stats(), "answer_cache": answer_cache.get_stats(),
+             "tables": get_table_stats([table for table_index in TABULAR_DATA.values() for table in table_index.values()])}
+
+    if EmbeddingModel.cache is not None:
+        stats["embedding_cache"] = EmbeddingModel.cache.get_stats()
+
+    return stats
+
 @app.get("/")
 def health_check_endpoint():
     return Response("Hi, I am Healthy RAG", status_code=200)
@@ -21,13 +21,43 @@ def apply_filter(files, uuid):
     headers = {'accept': 'application/json', 'uuid': uuid, 'Content-Type': 'application/json'}
     requests.post(url, headers=headers, data=json.dumps(files))
 
-# Utility function to generate responses (RAG query)
-def generate_response(user_input):
-    url = f"{BASE_URL}/query/"
-    headers = {'accept': 'application/json', 'uuid': st.session_state['uuid'], 'content-type': 'application/x-www-form-urlencoded'}
-    params = {'query': user_input}
-    response = requests.post(url, params=params, headers=headers)
-    return response.json()
+# Read server-sent events from a streaming endpoint as (event, data) pairs
+def stream_events(url, headers, params=None):
+    with requests.post(url, headers=headers, params=params, stream=True) as response:
+        if response.status_code != 200:
+            yield "error", {"detail": response.text}
+            return
+
+        event, data = None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data.append(line[len("data: "):])
+            elif not line and event:
+                yield event, json.loads("\n".join(data))
+                event, data = None, []
+
+# Stream the RAG answer into placeholders as it is generated
+def stream_response(user_input, sources_placeholder, answer_placeholder):
+    url = f"{BASE_URL}/query/stream/"
+    headers = {'accept': 'text/event-stream', 'uuid': st.session_state['uuid']}
+    answer = ""
+
+    for event, data in stream_events(url, headers, params={'query': user_input}):
+        if event == "metadata" and data["sources"]:
+            sources_placeholder.caption("Sources: " + "; ".join(
+                f"{file_name} (pages {', '.join(str(page) for page in pages)})" for file_name, pages in data["sources"].items()))
+        elif event == "revision":
+            answer = ""
+        elif event == "token":
+            answer += data
+            answer_placeholder.markdown(answer + "▌")
+        elif event == "error":
+            st.error(f"Failed to generate a response: {data['detail']}")
+
+    answer_placeholder.markdown(answer)
+    return answer
 
 # Process and upload files via backend (combined in one step)
 def process_files_on_backend(files, file_type):
@@ -141,17 +171,25 @@ compare_documents_button = st.button("Compare Documents")
 
 # Compare action calls backend directly
 if compare_documents_button:
-    url = f"{BASE_URL}/compare_documents/"
-    headers = {"uuid": st.session_state['uuid']}
-
-    response = requests.post(url, headers=headers)
-
-    if response.status_code == 200:
-        comparison_result = response.json()
-        st.subheader("🔍 Comparison Results")
-        st.write(comparison_result)
-    else:
-        st.error("Failed to compare documents. Please ensure both are uploaded and processed correctly.")
+    url = f"{BASE_URL}/compare_documents/stream/"
+    headers = {"accept": "text/event-stream", "uuid": st.session_state['uuid']}
+
+    st.subheader("🔍 Comparison Results")
+    fields_placeholder = st.empty()
+    assessment_placeholder = st.empty()
+    assessment = ""
+
+    for event, data in stream_events(url, headers):
+        if event == "metadata" and data["fields"]:
+            with fields_placeholder.expander("Field checks"):
+                st.dataframe(data["fields"], use_container_width=True)
+        elif event == "token":
+            assessment += data
+            assessment_placeholder.markdown(assessment + "▌")
+        elif event == "error":
+            st.error("Failed to compare documents. Please ensure both are uploaded and processed correctly.")
+
+    assessment_placeholder.markdown(assessment)
 
 # Chat Input and Display Logic
 input_container = st.container()
@@ -171,7 +209,12 @@ with response_container:
             st.warning('Please upload a PDF first.')
         else:
             get_styles("none")
-            response = generate_response(user_input)
+            sources_placeholder = st.empty()
+            answer_placeholder = st.empty()
+            response = stream_response(user_input, sources_placeholder, answer_placeholder)
+            # The history below renders the finished answer
+            sources_placeholder.empty()
+            answer_placeholder.empty()
             st.session_state.past.append(user_input)
             st.session_state.generated.append(response)
             get_styles("auto")
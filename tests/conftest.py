@@ -0,0 +1,9 @@
+import os
+
+# Importing `utils` builds the Azure chat model, which needs credentials and an endpoint.
+# The tests never call it, so placeholders let them run without a .env.
+os.environ.setdefault("openai_api_key", "test")
+os.environ.setdefault("api_base", "https://example.openai.azure.com/")
+os.environ.setdefault("api_version", "2024-02-01")
+os.environ.setdefault("api_type", "azure")
+os.environ.setdefault("parallel_token", "false")
@@ -0,0 +1,56 @@
+import random
+
+import numpy as np
+from langchain_core.documents import Document
+from rank_bm25 import BM25Okapi
+
+from utils.bm25_index import BM25Index, FileBM25Index
+
+random.seed(7)
+VOCABULARY = [f"term{index}" for index in range(30)] + ["invoice", "letter", "credit", "amount"]
+TEXTS = [" ".join(random.choices(VOCABULARY, k=random.randint(1, 40))) for _ in range(60)]
+QUERIES = ["invoice amount", "term1 term1 credit", "letter term29 unknown", "unknown"]
+
+
+def documents(texts, file_name="inv1.pdf"):
+    return [Document(page_content=text, metadata={"file_name": file_name}) for text in texts]
+
+
+def test_scores_match_rank_bm25():
+    index = FileBM25Index(documents(TEXTS))
+    reference = BM25Okapi([text.split() for text in TEXTS])
+
+    for query in QUERIES:
+        assert np.allclose(index.scores(query), reference.get_scores(query.split()), rtol=1e-4, atol=1e-5)
+
+
+def test_windows_added_incrementally_score_like_one_build():
+    index = FileBM25Index(documents(TEXTS[:5]))
+    for start in range(5, len(TEXTS), 7):
+        index.add_documents(documents(TEXTS[start:start + 7]))
+    reference = BM25Okapi([text.split() for text in TEXTS])
+
+    for query in QUERIES:
+        assert np.allclose(index.scores(query), reference.get_scores(query.split()), rtol=1e-4, atol=1e-5)
+
+
+def test_search_returns_the_best_chunks_of_one_file():
+    index = BM25Index()
+    index.add_documents(documents(TEXTS[:30]) + documents(TEXTS[30:], "lc.pdf"))
+    reference = BM25Okapi([text.split() for text in TEXTS[:30]])
+
+    results = index.search("invoice amount", "inv1.pdf", k=3)
+    expected = sorted(reference.get_scores(["invoice", "amount"]), reverse=True)[:3]
+
+    assert all(document.metadata["file_name"] == "inv1.pdf" for document, _ in results)
+    assert np.allclose([score for _, score in results], expected, rtol=1e-4, atol=1e-5)
+    assert index.search("invoice", "missing.pdf") == []
+
+
+def test_terms_in_most_chunks_use_the_idf_floor():
+    texts = [f"the {text}" for text in TEXTS[:40]] + TEXTS[40:]
+    index = FileBM25Index(documents(texts))
+    reference = BM25Okapi([text.split() for text in texts])
+
+    assert np.allclose(index.scores("the invoice"), reference.get_scores(["the", "invoice"]), rtol=1e-4, atol=1e-5)
+    assert index.floor is not None
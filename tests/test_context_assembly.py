@@ -0,0 +1,52 @@
+from langchain.docstore.document import Document
+
+from utils.context_assembly import deduplicate, merge_adjacent, overlap_words
+
+TEMPLATE = ("commercial invoice number 2024 seller acme trading co buyer globex inc description of goods "
+            "steel pipes quantity 100 unit price usd 100 total amount usd {amount} payment by letter of credit "
+            "port of loading shanghai port of discharge hamburg incoterms cif hamburg latest date of shipment "
+            "30 june 2025 partial shipments not allowed transhipment allowed documents required signed commercial "
+            "invoice in three originals full set of clean on board bills of lading made out to order of issuing bank "
+            "marked freight prepaid packing list certificate of origin issued by chamber of commerce insurance "
+            "certificate for 110 percent of invoice value covering institute cargo clauses a")
+
+
+def chunk(text, file_name="inv1.pdf", page_number=1):
+    return Document(page_content=text, metadata={"file_name": file_name, "page_number": page_number})
+
+
+def test_near_duplicates_in_different_files_are_kept():
+    scored = [(chunk(TEMPLATE.format(amount="10,000.00"), "inv1.pdf"), 0.03),
+              (chunk(TEMPLATE.format(amount="12,500.00"), "inv2.pdf"), 0.02)]
+
+    kept = deduplicate(scored)
+
+    assert sorted(document.metadata["file_name"] for document, _ in kept) == ["inv1.pdf", "inv2.pdf"]
+
+
+def test_near_duplicates_in_one_file_keep_the_best_scored():
+    scored = [(chunk(TEMPLATE.format(amount="10,000.00"), page_number=1), 0.01),
+              (chunk(TEMPLATE.format(amount="10,000.00") + " page", page_number=2), 0.03),
+              (chunk(TEMPLATE.format(amount="10,000.00"), page_number=1), 0.005)]
+
+    kept = deduplicate(scored)
+
+    assert [(document.metadata["page_number"], score) for document, score in kept] == [(2, 0.03)]
+
+
+def test_overlapping_chunks_of_a_page_are_merged():
+    words = [f"w{index}" for index in range(120)]
+    scored = [(chunk(" ".join(words[40:90])), 0.02),
+              (chunk(" ".join(words[0:50])), 0.03),
+              (chunk(" ".join(words[80:120])), 0.01),
+              (chunk(" ".join(words[80:120]), page_number=2), 0.015)]
+
+    merged = merge_adjacent(scored)
+
+    assert [(document.metadata["page_number"], document.page_content, score) for document, score in merged] == [
+        (1, " ".join(words), 0.03), (2, " ".join(words[80:120]), 0.015)]
+
+
+def test_short_overlaps_do_not_merge():
+    assert overlap_words("a b c d".split(), "c d e f".split()) == 0
+    assert overlap_words("a b c d e f g".split(), "c d e f g h".split()) == 5
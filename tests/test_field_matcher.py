@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+from utils.field_matcher import (DISCREPANCY, LC_FIELDS, MATCH, MISSING, compare_amount, compare_lc_number, find_field,
+                                 normalize_label, parse_amount, parse_date, parse_tolerance)
+
+
+def test_normalize_label_splits_camel_case_and_acronyms():
+    assert normalize_label("LCAmount") == "lc amount"
+    assert normalize_label("CurrencyCodeAmount") == "currency code amount"
+    assert normalize_label("32B: Currency Code, Amount") == "32b currency code amount"
+
+
+def test_amount_lookup_skips_tolerance_field():
+    lc_fields = {normalize_label("Percentage Credit Amount Tolerance"): "05/05",
+                 normalize_label("Amount"): "USD 100,000.00"}
+
+    label, value = find_field(lc_fields, LC_FIELDS["amount"], exclude=LC_FIELDS["tolerance"])
+
+    assert (label, value) == ("amount", "USD 100,000.00")
+
+
+def test_amount_with_tolerance_is_not_a_discrepancy():
+    lc_fields = {normalize_label("Amount"): "USD 100,000.00",
+                 normalize_label("Percentage Credit Amount Tolerance"): "05/05"}
+    invoice_fields = {"invoice total": "USD 100,005.25"}
+
+    results = {item["field"]: item for item in compare_amount(lc_fields, invoice_fields)}
+
+    assert results["currency"]["status"] == MATCH
+    assert results["amount"]["status"] == MATCH
+    assert results["amount"]["lc_value"] == 100000.0
+
+
+def test_amount_over_tolerance_is_a_discrepancy():
+    lc_fields = {"amount": "USD 100,000.00", "tolerance": "05/05"}
+    invoice_fields = {"invoice total": "USD 106,000.00"}
+
+    results = {item["field"]: item for item in compare_amount(lc_fields, invoice_fields)}
+
+    assert results["amount"]["status"] == DISCREPANCY
+
+
+def test_label_aliases_match_whole_words_only():
+    fields = {"credit amount tolerance": "10/10", "32b currency code amount": "EUR 5.000,00"}
+
+    assert find_field(fields, LC_FIELDS["amount"], exclude=LC_FIELDS["tolerance"]) == \
+        ("32b currency code amount", "EUR 5.000,00")
+
+
+def test_parse_amount_formats():
+    assert parse_amount("USD 12,345.67") == (Decimal("12345.67"), "USD")
+    assert parse_amount("EUR 12.345,67") == (Decimal("12345.67"), "EUR")
+    assert parse_amount("USD12345,67") == (Decimal("12345.67"), "USD")
+    assert parse_amount({"amount": 10.5, "currency": "GBP"}) == (Decimal("10.5"), "GBP")
+
+
+def test_parse_amount_ignores_counts_before_the_amount():
+    assert parse_amount("Total 3 items 1,500.00") == (Decimal("1500.00"), None)
+    assert parse_amount("3 items, total $ 1,500.00") == (Decimal("1500.00"), "USD")
+
+
+def test_parse_tolerance_and_dates():
+    assert parse_tolerance("10/10") == (Decimal("0.1"), Decimal("0.1"))
+    assert parse_tolerance("+/- 5%") == (Decimal("0.05"), Decimal("0.05"))
+    assert parse_date("250630 IN SINGAPORE").isoformat() == "2025-06-30"
+    assert parse_date("30 June 2025").isoformat() == "2025-06-30"
+
+
+def test_invoice_without_the_lc_reference_is_a_discrepancy():
+    lc_fields = {"documentary credit number": "LC-2024/0815"}
+
+    assert compare_lc_number(lc_fields, {}, "Payment under L/C LC 2024 0815")["status"] == MATCH
+    assert compare_lc_number(lc_fields, {}, "Payment by bank transfer")["status"] == DISCREPANCY
+    assert compare_lc_number({}, {}, "Payment under L/C LC 2024 0815")["status"] == MISSING
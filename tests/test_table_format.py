@@ -0,0 +1,53 @@
+from utils.table_format import parse_html_table, prune_rows, query_terms, render_table
+
+
+def test_row_and_column_spans_are_repeated():
+    html = ("<table><tr><th>Item</th><th colspan=\"2\">Price</th></tr>"
+            "<tr><td rowspan=\"2\">Steel pipes</td><td>USD</td><td>10</td></tr>"
+            "<tr><td>EUR</td><td>9</td></tr>"
+            "<tr><td>Valves</td><td rowspan=\"2\" colspan=\"2\">on request</td></tr>"
+            "<tr><td>Flanges</td></tr></table>")
+
+    assert parse_html_table(html) == [["Item", "Price", "Price"],
+                                      ["Steel pipes", "USD", "10"],
+                                      ["Steel pipes", "EUR", "9"],
+                                      ["Valves", "on request", "on request"],
+                                      ["Flanges", "on request", "on request"]]
+
+
+def test_short_rows_are_padded():
+    assert parse_html_table("<table><tr><td>a</td><td>b</td></tr><tr><td>c</td></tr></table>") == \
+        [["a", "b"], ["c", ""]]
+
+
+def large_table():
+    header = ["Port", "Vessel", "Freight", "Insurance", "Origin", "Weight"]
+    body = [[f"Port {index}", f"Vessel {index}", f"{index}00", f"{index}0", "China", f"{index} t"]
+            for index in range(10)]
+    body[3][1] = "Hamburg Express"
+    return [header] + body
+
+
+def test_pruning_keeps_header_first_column_and_matching_rows():
+    rows = prune_rows(large_table(), query_terms("What is the freight of the Hamburg Express?"))
+
+    assert rows == [["Port", "Freight"], ["Port 3", "300"]]
+
+
+def test_tables_the_query_does_not_match_are_kept_whole():
+    rows = large_table()
+
+    assert prune_rows(rows, query_terms("Who is the beneficiary?")) == rows
+
+
+def test_small_tables_are_not_pruned():
+    rows = [row[:4] for row in large_table()[:4]]
+
+    assert prune_rows(rows, query_terms("freight")) == rows
+
+
+def test_render_table_labels_each_table():
+    table = {"file_name": "inv1.pdf", "page_number": 2,
+             "tables": [{"rows": [["Item", "Qty"], ["Steel | pipes", "100"]], "html_tokens": 0, "tokens": 0}]}
+
+    assert render_table(table) == "[inv1.pdf, page 2, table 1]\nItem | Qty\nSteel / pipes | 100"
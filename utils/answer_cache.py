@@ -0,0 +1,185 @@
+from collections import OrderedDict
+import numpy as np
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def normalize_query(query) -> str:
+    """
+    Normalizes a question so that case, punctuation and spacing do not make a new cache key.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+class AnswerCache:
+    """
+    In-memory cache of /query/ answers.
+
+    An answer is stored under its session and a scope: the session's files, its file filter, the
+    guidelines version and the session generation. A lookup matches the normalized question
+    exactly, or else the cached question whose embedding is closest to it when the cosine
+    similarity reaches `similarity`. Entries expire after `ttl` seconds and the least recently
+    used ones are evicted beyond `max_items`. `invalidate` bumps the generation of a session, so
+    an answer computed while its files were changing is never served afterwards.
+
+    Attributes:
+    - stats: Exact hit, semantic hit, miss, expiration, eviction and invalidation counters.
+    """
+
+    def __init__(self, embedding_model=None, max_items=1000, ttl=3600.0, similarity=0.97, enabled=True):
+        self.embedding_model = embedding_model
+        self.max_items = max_items
+        self.ttl = ttl
+        self.similarity = similarity
+        self.enabled = enabled
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.global_generation = 0
+        self.lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "expirations": 0,
+                      "evictions": 0, "invalidations": 0}
+
+    def generation(self, uuid) -> tuple:
+        """
+        The current generation of a session, bumped by every invalidation that covers it.
+        """
+        with self.lock:
+            return self.global_generation, self.generations.get(uuid, 0)
+
+    def embed(self, query):
+        if self.embedding_model is None or self.similarity > 1:
+            return None
+        return np.asarray(self.embedding_model.embed_query(query), dtype=np.float32)
+
+    def get_exact(self, uuid, scope, query):
+        """
+        Returns the cached answer of exactly this normalized question, or None. It does not
+        embed anything, so callers run it inline before falling back to `get`.
+        """
+        if not self.enabled:
+            return None
+
+        key = (uuid, scope, normalize_query(query))
+        with self.lock:
+            self.expire(time.monotonic())
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.stats["exact_hits"] += 1
+            return entry["value"]
+
+    def get(self, uuid, scope, query):
+        """
+        Returns the cached answer of a question, or None. The semantic lookup embeds the
+        question, so this blocks on the embedding model.
+
+        Parameters:
+        - uuid (str): The session id.
+        - scope (tuple): Files, filter and guidelines version the answer depends on, from `answer_scope`.
+        - query (str): The user question.
+
+        Returns:
+        - dict: The cached answer and its metadata, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+
+        normalized = normalize_query(query)
+        with self.lock:
+            self.expire(time.monotonic())
+            entry = self.entries.get((uuid, scope, normalized))
+            if entry is not None:
+                self.entries.move_to_end((uuid, scope, normalized))
+                self.stats["exact_hits"] += 1
+                return entry["value"]
+            candidates = [(key, entry["vector"]) for key, entry in self.entries.items()
+                          if key[:2] == (uuid, scope) and entry["vector"] is not None]
+
+        if candidates:
+            try:
+                vector = self.embed(normalized)
+                if vector is not None:
+                    scores = np.stack([candidate for _, candidate in candidates]) @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        with self.lock:
+                            entry = self.entries.get(candidates[best][0])
+                            if entry is not None:
+                                self.entries.move_to_end(candidates[best][0])
+                                self.stats["semantic_hits"] += 1
+                                logging.info(f"Answer Cache matched '{candidates[best][0][2]}' "
+                                             f"with similarity {scores[best]:.3f}")
+                                return entry["value"]
+            except Exception as e:
+                logging.error(f"Error while Matching Answer Cache: {e} trace_back:{traceback.format_exc()}")
+
+        with self.lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, uuid, scope, query, value):
+        """
+        Stores an answer unless the session was invalidated since `scope` was taken.
+        """
+        if not self.enabled or value is None:
+            return
+
+        normalized = normalize_query(query)
+        try:
+            vector = self.embed(normalized)
+        except Exception as e:
+            logging.error(f"Error while Embedding Answer Cache Query: {e} trace_back:{traceback.format_exc()}")
+            vector = None
+
+        with self.lock:
+            if scope[-1] != (self.global_generation, self.generations.get(uuid, 0)):
+                return
+            self.entries[(uuid, scope, normalized)] = {"value": value, "vector": vector,
+                                                       "expires": time.monotonic() + self.ttl}
+            self.entries.move_to_end((uuid, scope, normalized))
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def expire(self, now):
+        for key in [key for key, entry in self.entries.items() if entry["expires"] <= now]:
+            del self.entries[key]
+            self.stats["expirations"] += 1
+
+    def invalidate(self, uuid=None):
+        """
+        Drops the answers of a session, or of every session when `uuid` is None.
+        """
+        with self.lock:
+            for key in [key for key in self.entries if uuid is None or key[0] == uuid]:
+                del self.entries[key]
+            if uuid is None:
+                self.global_generation += 1
+            else:
+                self.generations[uuid] = self.generations.get(uuid, 0) + 1
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["items"] = len(self.entries)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+
+answer_cache = AnswerCache(
+    max_items=int(os.getenv("ANSWER_CACHE_MAX_ITEMS", "1000")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    similarity=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.97")),
+    enabled=os.getenv("ANSWER_CACHE", "true").lower() == "true"
+)
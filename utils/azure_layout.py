@@ -0,0 +1,94 @@
+from html import escape
+
+
+def find_analyze_result(data, depth=0):
+    """
+    Finds the Azure Document Intelligence analyze result (the object holding `content` and
+    `pages`) in a parser response, which may wrap it in `analyzeResult` or another key.
+
+    Parameters:
+    - data (dict): The parser response.
+
+    Returns:
+    - dict: The analyze result, or None when the response carries no layout.
+    """
+    if not isinstance(data, dict) or depth > 3:
+        return None
+
+    if isinstance(data.get("pages"), list) and ("content" in data or data["pages"] and "lines" in data["pages"][0]):
+        return data
+
+    for key in ("analyzeResult", "analyze_result", "result"):
+        if key in data:
+            found = find_analyze_result(data[key], depth + 1)
+            if found:
+                return found
+
+    for value in data.values():
+        if isinstance(value, dict):
+            found = find_analyze_result(value, depth + 1)
+            if found:
+                return found
+    return None
+
+
+def page_texts(result) -> dict:
+    """
+    Returns the text of every page, using the page spans over `content` when present and the
+    page lines otherwise.
+
+    Parameters:
+    - result (dict): The analyze result.
+
+    Returns:
+    - dict: Page number mapped to its text.
+    """
+    content = result.get("content") or ""
+    texts = {}
+    for position, page in enumerate(result.get("pages", []), start=1):
+        page_number = page.get("pageNumber", position)
+        spans = page.get("spans") or []
+        if content and spans:
+            text = " ".join(content[span["offset"]:span["offset"] + span["length"]] for span in spans)
+        else:
+            text = "\n".join(line.get("content", "") for line in page.get("lines") or [])
+        texts[page_number] = text
+    return texts
+
+
+def table_to_html(table) -> str:
+    """
+    Renders an Azure table as HTML in the same shape as unstructured's `text_as_html`.
+    """
+    rows = {}
+    for cell in table.get("cells", []):
+        rows.setdefault(cell.get("rowIndex", 0), []).append(cell)
+
+    html_rows = []
+    for row_index in sorted(rows):
+        html_cells = []
+        for cell in sorted(rows[row_index], key=lambda cell: cell.get("columnIndex", 0)):
+            tag = "th" if cell.get("kind") in ("columnHeader", "rowHeader") else "td"
+            spans = ""
+            if cell.get("rowSpan", 1) > 1:
+                spans += f' rowspan="{cell["rowSpan"]}"'
+            if cell.get("columnSpan", 1) > 1:
+                spans += f' colspan="{cell["columnSpan"]}"'
+            html_cells.append(f"<{tag}{spans}>{escape(cell.get('content', ''))}</{tag}>")
+        html_rows.append(f"<tr>{''.join(html_cells)}</tr>")
+    return f"<table>{''.join(html_rows)}</table>"
+
+
+def page_tables(result) -> dict:
+    """
+    Groups the tables of an analyze result by the page they start on.
+
+    Returns:
+    - dict: Page number mapped to a list of table HTML strings.
+    """
+    tables = {}
+    for table in result.get("tables") or []:
+        regions = table.get("boundingRegions") or [{}]
+        page_number = regions[0].get("pageNumber", 1)
+        tables.setdefault(page_number, []).append(table_to_html(table))
+    return tables
@@ -0,0 +1,217 @@
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.documents import Document
+from typing import Any, List
+import numpy as np
+import math
+import threading
+
+
+def tokenize(text) -> list:
+    """
+    Splits text into BM25 terms, same as the default BM25Retriever preprocessing.
+    """
+    return text.split()
+
+
+class FileBM25Index:
+    """
+    Okapi BM25 inverted index over the chunks of a single file.
+
+    Every term maps to a postings pair (document ids, term counts). Adding chunks only appends
+    their postings and lengths, so indexing a file window by window costs the same as indexing
+    it at once. The corpus statistics are computed when a query needs them: the idf of the query
+    terms, the length norms once per version of the index and the average idf floor only when a
+    query term is in more than half of the chunks. The scoring constants and the idf flooring
+    follow rank_bm25's BM25Okapi, which BM25Retriever uses. A lock keeps queries from reading
+    the postings of a window while it is being added.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75, epsilon=0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.documents = []
+        self.doc_lengths = []
+        self.postings = {}
+        self.arrays = {}
+        self.version = 0
+        self.statistics_version = None
+        self.length_norm = np.zeros(0, dtype=np.float32)
+        self.floor = None
+        self.lock = threading.Lock()
+        self.add_documents(documents)
+
+    def add_documents(self, documents):
+        """
+        Adds chunks to the file index, appending their postings.
+
+        Parameters:
+        - documents (List[Document]): Chunks of this file.
+        """
+        tokenized = [(document, tokenize(document.page_content)) for document in documents]
+        with self.lock:
+            for document, tokens in tokenized:
+                doc_id = len(self.documents)
+                self.documents.append(document)
+                self.doc_lengths.append(len(tokens))
+                counts = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, count in counts.items():
+                    posting = self.postings.setdefault(token, ([], []))
+                    posting[0].append(doc_id)
+                    posting[1].append(count)
+                    self.arrays.pop(token, None)
+            self.version += 1
+
+    def update_statistics(self):
+        """
+        Recomputes the length norms after chunks were added. Called with the lock held.
+        """
+        if self.statistics_version == self.version:
+            return
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self.length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / (average_length or 1.0))
+        self.floor = None
+        self.statistics_version = self.version
+
+    def idf(self, token) -> float:
+        corpus_size = len(self.documents)
+        frequency = len(self.postings[token][0])
+        idf = math.log(corpus_size - frequency + 0.5) - math.log(frequency + 0.5)
+        if idf >= 0:
+            return idf
+
+        # Negative idfs are replaced by epsilon times the average idf of the vocabulary
+        if self.floor is None:
+            frequencies = np.fromiter((len(doc_ids) for doc_ids, _ in self.postings.values()),
+                                      dtype=np.float64, count=len(self.postings))
+            idfs = np.log(corpus_size - frequencies + 0.5) - np.log(frequencies + 0.5)
+            self.floor = self.epsilon * float(idfs.mean())
+        return self.floor
+
+    def weights(self, token):
+        """
+        Returns the (document ids, BM25 weights) of a term, or None when no chunk has it.
+        Called with the lock held, after `update_statistics`.
+        """
+        if token not in self.postings:
+            return None
+        if token not in self.arrays:
+            doc_ids, counts = self.postings[token]
+            self.arrays[token] = (np.asarray(doc_ids, dtype=np.int32), np.asarray(counts, dtype=np.float32))
+        doc_ids, counts = self.arrays[token]
+        return doc_ids, self.idf(token) * counts * (self.k1 + 1) / (counts + self.length_norm[doc_ids])
+
+    def scores(self, query) -> np.ndarray:
+        """
+        Scores every chunk of the file against a query.
+
+        Parameters:
+        - query (str): The search query.
+
+        Returns:
+        - np.ndarray: BM25 score per chunk.
+        """
+        with self.lock:
+            self.update_statistics()
+            scores = np.zeros(len(self.documents), dtype=np.float32)
+            for token in tokenize(query):
+                posting = self.weights(token)
+                if posting is not None:
+                    scores[posting[0]] += posting[1]
+            return scores
+
+    def search(self, query, k=6) -> list:
+        """
+        Returns the top k chunks for a query, best first.
+
+        Parameters:
+        - query (str): The search query.
+        - k (int): Number of chunks to return.
+
+        Returns:
+        - list: (Document, score) pairs.
+        """
+        if not self.documents:
+            return []
+
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.documents[doc_id], float(scores[doc_id])) for doc_id in top]
+
+
+class BM25Index:
+    """
+    Per-session BM25 index made of one FileBM25Index per uploaded file.
+
+    Files are indexed once at ingest time; adding or removing a file only touches that file's index.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def add_documents(self, documents):
+        """
+        Indexes new chunks, grouped by their `file_name` metadata.
+
+        Parameters:
+        - documents (List[Document]): New chunks.
+        """
+        grouped = {}
+        for document in documents:
+            grouped.setdefault(document.metadata.get("file_name"), []).append(document)
+
+        for file_name, file_documents in grouped.items():
+            if file_name in self.files:
+                self.files[file_name].add_documents(file_documents)
+            else:
+                self.files[file_name] = FileBM25Index(file_documents)
+
+    def remove_file(self, file_name):
+        self.files.pop(file_name, None)
+
+    def search(self, query, file_name, k=6) -> list:
+        """
+        Returns the top k (Document, score) pairs of one file.
+        """
+        index = self.files.get(file_name)
+        return index.search(query, k) if index else []
+
+    def search_files(self, query, file_names, k=6) -> dict:
+        """
+        Scores a query against several files in one pass.
+
+        Each file keeps its own corpus statistics, so the results match per-file retrieval.
+
+        Parameters:
+        - query (str): The search query.
+        - file_names (list): Files to search.
+        - k (int): Number of chunks per file.
+
+        Returns:
+        - dict: File name mapped to its top k (Document, score) pairs.
+        """
+        return {file_name: self.search(query, file_name, k) for file_name in file_names}
+
+    def as_retriever(self, file_name, k=6) -> "BM25FileRetriever":
+        """
+        Wraps the index of one file as a LangChain retriever.
+        """
+        return BM25FileRetriever(index=self, file_name=file_name, k=k)
+
+
+class BM25FileRetriever(BaseRetriever):
+    """
+    LangChain retriever over one file of a BM25Index.
+    """
+
+    index: Any
+    file_name: str
+    k: int = 6
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return [document for document, _ in self.index.search(query, self.file_name, self.k)]
@@ -0,0 +1,176 @@
+from langchain.docstore.document import Document
+from .prompt_compaction import count_tokens
+from .table_format import render_table
+import logging
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# Tokens of retrieved text and of reference tables allowed in the QA prompt, budgeted separately
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+TABLE_TOKEN_BUDGET = int(os.getenv("CONTEXT_TABLE_TOKEN_BUDGET", "1500"))
+# Word trigram Jaccard similarity from which two chunks count as the same text
+DEDUP_SIMILARITY = float(os.getenv("CONTEXT_DEDUP_SIMILARITY", "0.9"))
+# Shortest shared run of words that makes two chunks of a page adjacent (the splitter overlaps them)
+MIN_OVERLAP_WORDS = 5
+MAX_OVERLAP_WORDS = 100
+
+
+def shingles(text) -> set:
+    words = text.split()
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[index:index + 3]) for index in range(len(words) - 2)}
+
+
+def overlap_words(first, second) -> int:
+    """
+    Number of words at the end of `first` that start `second`, 0 when below MIN_OVERLAP_WORDS.
+    """
+    for size in range(min(len(first), len(second), MAX_OVERLAP_WORDS), MIN_OVERLAP_WORDS - 1, -1):
+        if first[-size:] == second[:size]:
+            return size
+    return 0
+
+
+def deduplicate(scored_documents) -> list:
+    """
+    Drops repeated chunks, keeping the best scored copy: the same file, page and text, or text
+    of the same file whose word trigrams overlap by DEDUP_SIMILARITY or more. Near duplicates
+    in different files are kept, two invoices from one template differ only in their values.
+
+    Parameters:
+    - scored_documents (list): (Document, score) pairs.
+
+    Returns:
+    - list: (Document, score) pairs sorted by score in descending order.
+    """
+    kept = []
+    identities = set()
+    file_shingles = {}
+    for document, score in sorted(scored_documents, key=lambda item: item[1], reverse=True):
+        file_name = document.metadata.get("file_name")
+        identity = (file_name, document.metadata.get("page_number"), document.page_content)
+        if identity in identities:
+            continue
+
+        document_shingles = shingles(document.page_content)
+        kept_shingles = file_shingles.setdefault(file_name, [])
+        if any(len(document_shingles & other) / len(document_shingles | other) >= DEDUP_SIMILARITY
+               for other in kept_shingles):
+            continue
+
+        identities.add(identity)
+        kept_shingles.append(document_shingles)
+        kept.append((document, score))
+    return kept
+
+
+def merge_adjacent(scored_documents) -> list:
+    """
+    Merges chunks of the same page whose text overlaps, as consecutive splitter chunks do, into
+    one chunk without the repeated words. A merged chunk keeps the best score of its parts.
+
+    Parameters:
+    - scored_documents (list): (Document, score) pairs.
+
+    Returns:
+    - list: (Document, score) pairs sorted by score in descending order.
+    """
+    pages = {}
+    for document, score in scored_documents:
+        key = (document.metadata.get("file_name"), document.metadata.get("page_number"))
+        pages.setdefault(key, []).append([document.page_content.split(), score, document.metadata])
+
+    merged = []
+    for chunks in pages.values():
+        merging = True
+        while merging and len(chunks) > 1:
+            merging = False
+            for first in chunks:
+                for second in chunks:
+                    if first is second:
+                        continue
+                    size = overlap_words(first[0], second[0])
+                    if size:
+                        first[0] = first[0] + second[0][size:]
+                        first[1] = max(first[1], second[1])
+                        chunks.remove(second)
+                        merging = True
+                        break
+                if merging:
+                    break
+
+        for words, score, metadata in chunks:
+            merged.append((Document(page_content=" ".join(words), metadata=metadata), score))
+
+    return sorted(merged, key=lambda item: item[1], reverse=True)
+
+
+def render_document(document) -> str:
+    return f"[{document.metadata.get('file_name')}, page {document.metadata.get('page_number')}]\n{document.page_content}"
+
+
+def render_context(documents) -> str:
+    """
+    Writes the assembled chunks for the QA prompt, each under its file name and page.
+    """
+    return "\n\n".join(render_document(document) for document in documents)
+
+
+def assemble_context(scored_documents, budget=None) -> list:
+    """
+    Turns the retrieved chunks into the context of the QA prompt: repeated and near-duplicate
+    chunks are dropped, overlapping chunks of a page are merged, and the chunks are packed by
+    fused score into `budget` tokens. A chunk that does not fit is skipped so smaller ones
+    further down can still be used.
+
+    Parameters:
+    - scored_documents (list): (Document, fused score) pairs from the retrievers.
+    - budget (int): Token budget of the context, CONTEXT_TOKEN_BUDGET by default.
+
+    Returns:
+    - list: The packed documents, best scored first.
+    """
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    candidates = merge_adjacent(deduplicate(scored_documents))
+
+    context = []
+    used = 0
+    for document, _ in candidates:
+        tokens = count_tokens(render_document(document)) + 1
+        if used + tokens <= budget:
+            context.append(document)
+            used += tokens
+
+    logging.info(f"Assembled Context: {len(scored_documents)} chunks retrieved, {len(candidates)} after "
+                 f"deduplication and merging, {len(context)} packed in {used}/{budget} tokens")
+    return context
+
+
+def pack_tables(tables, query=None, budget=None) -> list:
+    """
+    Renders the reference tables compactly, pruned by the query, and keeps them in the order
+    given while they fit in their own token budget.
+
+    Parameters:
+    - tables (list): Table entries from `get_tables`.
+    - query (str): The user question, used to prune large tables.
+    - budget (int): Token budget of the tables, CONTEXT_TABLE_TOKEN_BUDGET by default.
+
+    Returns:
+    - list: The rendered tables that fit.
+    """
+    budget = budget or TABLE_TOKEN_BUDGET
+    packed = []
+    used = 0
+    for table in tables:
+        rendered = render_table(table, query)
+        tokens = count_tokens(rendered) + 1
+        if used + tokens <= budget:
+            packed.append(rendered)
+            used += tokens
+
+    if len(packed) < len(tables):
+        logging.info(f"Packed {len(packed)} of {len(tables)} Reference Tables in {used}/{budget} tokens")
+    return packed
@@ -1,8 +1,8 @@
 from .user import USER_FILES, USER_FILTER_FILES
 from qdrant_client.http import models as qdrant_models
 from langchain.retrievers import EnsembleRetriever
-from langchain_community.retrievers import BM25Retriever
-import logging, traceback
+from langchain.docstore.document import Document
+import logging, traceback, os
 
 
 def vector_store_retriever(file, vector_store):
@@ -38,36 +38,33 @@ def vector_store_retriever(file, vector_store):
         raise Exception(f"{error_msg} {e}")
 
 
-def bm25_retriever(file, documents):
+def bm25_retriever(file, bm25_index):
     """
-    Initializes a BM25 Retriever for documents related to a specific file.
+    Returns a BM25 Retriever over the prebuilt index of a specific file.
 
     Parameters:
-    - file (str): The name of the file to filter documents by.
-    - documents (list): A list of document objects, each with a 'metadata' attribute containing a 'file_name' key.
+    - file (str): The name of the file to retrieve from.
+    - bm25_index (BM25Index): The session's BM25 index, built at ingest time.
 
     Returns:
-    - BM25Retriever: An instance of BM25Retriever initialized with documents related to the specified file.
+    - BM25FileRetriever: A retriever returning the top 6 chunks of the specified file.
     """
     try:
-        filtered_docs = [doc for doc in documents if doc.metadata.get("file_name") == file]
-        retriever = BM25Retriever.from_documents(filtered_docs)
-        retriever.k = 6
-        return retriever
+        return bm25_index.as_retriever(file, k=6)
     except Exception as e:
         error_msg = "Error in bm25_retriever:"
         logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
         raise Exception(f"{error_msg} {e}")
 
 
-def ensemble_retriever(vector_store, documents, uuid, query):
+def ensemble_retriever(vector_store, bm25_index, uuid, query):
     """
     Retrieves relevant documents based on a given query using an ensemble approach
     that combines vector-based and BM25 retrievers.
 
     Parameters:
     - vector_store: The storage for vector embeddings of documents.
-    - documents: A collection of documents to be searched.
+    - bm25_index: The session's BM25 index over the uploaded documents.
     - uuid: A unique identifier for the user, used to select specific files for retrieval.
     - query: The search query for retrieving relevant documents.
 
@@ -83,7 +80,7 @@ def ensemble_retriever(vector_store, documents, uuid, query):
         context = []
         for file in selected_files:
             vector_retriever = vector_store_retriever(file, vector_store)
-            bm25 = bm25_retriever(file, documents)
+            bm25 = bm25_retriever(file, bm25_index)
             ensemble = EnsembleRetriever(retrievers=[vector_retriever, bm25], weights=[0.5, 0.5])
 
             # This is the main change: use `invoke()` instead of `get_relevant_documents()`
@@ -96,3 +93,142 @@ def ensemble_retriever(vector_store, documents, uuid, query):
         error_msg = "Error in ensemble_retriever:"
         logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
         raise Exception(f"{error_msg} {e}")
+
+
+def reciprocal_rank_fusion(doc_lists, weights, c=60) -> list:
+    """
+    Fuses ranked document lists with weighted reciprocal rank fusion, the same way
+    EnsembleRetriever does: documents are deduplicated by content and scored cumulatively.
+
+    Parameters:
+    - doc_lists (list): Ranked lists of documents, best first.
+    - weights (list): One weight per list.
+    - c (int): RRF rank constant.
+
+    Returns:
+    - list: (Document, fused score) pairs sorted by score in descending order.
+    """
+    scores = {}
+    unique_docs = {}
+    for doc_list, weight in zip(doc_lists, weights):
+        for rank, doc in enumerate(doc_list, start=1):
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + weight / (rank + c)
+            unique_docs.setdefault(doc.page_content, doc)
+
+    return sorted(((doc, scores[key]) for key, doc in unique_docs.items()), key=lambda item: item[1], reverse=True)
+
+
+def batched_vector_search(vector_store, files, query, k=6, score_threshold=0.5) -> dict:
+    """
+    Runs a single grouped similarity search covering all selected files.
+
+    Parameters:
+    - vector_store (Qdrant Model Object): The session's vector store.
+    - files (list): Names of the files to search.
+    - query (str): The search query.
+    - k (int): Number of chunks per file.
+    - score_threshold (float): Minimum cosine similarity of a returned chunk.
+
+    Returns:
+    - dict: File name mapped to its top k documents, best first.
+    """
+    try:
+        query_vector = vector_store.embeddings.embed_query(query)
+        result = vector_store.client.search_groups(
+            collection_name=vector_store.collection_name,
+            query_vector=query_vector,
+            group_by="metadata.file_name",
+            query_filter=qdrant_models.Filter(must=[
+                qdrant_models.FieldCondition(
+                    key="metadata.file_name",
+                    match=qdrant_models.MatchAny(any=list(files))
+                )
+            ]),
+            limit=len(files),
+            group_size=k,
+            score_threshold=score_threshold,
+            with_payload=True
+        )
+
+        file_documents = {}
+        for group in result.groups:
+            documents = []
+            for point in group.hits:
+                payload = point.payload or {}
+                metadata = dict(payload.get(vector_store.metadata_payload_key) or {})
+                metadata["_id"] = point.id
+                metadata["_collection_name"] = vector_store.collection_name
+                documents.append(Document(page_content=payload.get(vector_store.content_payload_key, ""), metadata=metadata))
+            file_documents[group.id] = documents
+
+        return file_documents
+    except Exception as e:
+        error_msg = "Error in batched_vector_search:"
+        logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
+        raise Exception(f"{error_msg} {e}")
+
+
+def batched_ensemble_retriever(vector_store, bm25_index, uuid, query, with_scores=False):
+    """
+    Retrieves relevant documents for all selected files with one vector search and one BM25
+    pass, then fuses the two rankings of each file locally with reciprocal rank fusion.
+
+    Returns the same per-file top-k documents as `ensemble_retriever`, in the order of the
+    selected files.
+
+    Parameters:
+    - vector_store: The storage for vector embeddings of documents.
+    - bm25_index: The session's BM25 index over the uploaded documents.
+    - uuid: A unique identifier for the user, used to select specific files for retrieval.
+    - query: The search query for retrieving relevant documents.
+    - with_scores: Return (Document, fused score) pairs instead of documents.
+
+    Returns:
+    - context: A list of documents relevant to the query.
+    """
+    try:
+        selected_files = USER_FILTER_FILES.get(uuid, [])
+        if not selected_files:
+            selected_files = USER_FILES.get(uuid, [])
+        if not selected_files:
+            return []
+
+        vector_results = batched_vector_search(vector_store, selected_files, query, k=6)
+        bm25_results = bm25_index.search_files(query, selected_files, k=6)
+
+        context = []
+        for file in selected_files:
+            fused = reciprocal_rank_fusion(
+                [vector_results.get(file, []), [doc for doc, _ in bm25_results.get(file, [])]],
+                weights=[0.5, 0.5]
+            )
+            context.extend(fused if with_scores else [doc for doc, _ in fused])
+
+        return context
+    except Exception as e:
+        error_msg = "Error in batched_ensemble_retriever:"
+        logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
+        raise Exception(f"{error_msg} {e}")
+
+
+def retrieve_context(vector_store, bm25_index, uuid, query, with_scores=False):
+    """
+    Retrieves the query context with the retrieval path selected by RETRIEVAL_MODE
+    ("batched", the default, or "per_file").
+
+    With `with_scores`, returns (Document, fused score) pairs; the per_file path has no fused
+    scores, so its documents get the reciprocal rank score of their position in their file.
+    """
+    if os.getenv("RETRIEVAL_MODE", "batched") == "per_file":
+        context = ensemble_retriever(vector_store, bm25_index, uuid, query)
+        if not with_scores:
+            return context
+
+        ranks = {}
+        scored = []
+        for doc in context:
+            file_name = doc.metadata.get("file_name")
+            ranks[file_name] = ranks.get(file_name, 0) + 1
+            scored.append((doc, 1 / (ranks[file_name] + 60)))
+        return scored
+    return batched_ensemble_retriever(vector_store, bm25_index, uuid, query, with_scores=with_scores)
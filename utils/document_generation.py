@@ -2,13 +2,48 @@ import re,string
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import UnstructuredPDFLoader
 from langchain.docstore.document import Document
+from pypdf import PdfReader
+from .pdf_strategy import plan_pages, write_subset, log_plan
+from .azure_layout import find_analyze_result, page_texts, page_tables
+from .table_format import compact_tables
 import logging
 import traceback
+import tempfile
+import time
+import os
+from dotenv import load_dotenv
+load_dotenv()
 
 class DocumentGenerator:
 
     def __init__(self) -> None:
-        pass
+        # "adaptive" picks fast / hi_res / ocr_only per page, "hi_res" parses every page with the layout model
+        self.strategy = os.getenv("PDF_STRATEGY", "adaptive")
+        # Pages parsed, cleaned and split together by the streaming ingestion pipeline
+        self.window_pages = int(os.getenv("PDF_STREAM_PAGES", "4"))
+
+    @property
+    def parser_version(self) -> str:
+        # Bump when the parsing or cleaning output changes, it is part of the parse cache key
+        return f"unstructured-{self.strategy}-v3"
+
+    def rename_documents(self,documents,tables,file_name):
+        """
+        Returns copies of cached documents and tables under a new file name.
+
+        Parameters:
+        - documents (List[Document]): Split documents of a previously parsed file.
+        - tables (dict): Table index of that file keyed by (file_name, page_number).
+        - file_name (str): The name of the file being processed now.
+
+        Returns:
+        List[Document], dict: Documents and table index carrying the new file name.
+        """
+        renamed_documents = [Document(page_content=document.page_content,metadata={**document.metadata,"file_name":file_name})
+                             for document in documents]
+        renamed_tables = {(file_name,page_number): {**table,"file_name":file_name}
+                          for (_,page_number),table in tables.items()}
+        return renamed_documents,renamed_tables
 
     def clean_data(self,data)-> str:
         """
@@ -38,6 +73,7 @@ class DocumentGenerator:
 
         Returns:
             List[Document]: List of page-wise cleaned documents with added metadata.
+            dict: Table index mapping (file_name, page_number) to the page's table entry.
         """
         logging.info("Cleaning Documents")
         try:
@@ -46,7 +82,7 @@ class DocumentGenerator:
             page_documents = []
             previous_page = 0
             tabular_data = []
-            page_tables = []
+            page_tables = {}
 
             for document in document_list:
                 page_number = document.metadata.get("page_number")
@@ -56,8 +92,9 @@ class DocumentGenerator:
                     data = self.clean_data(' '.join(page_data))
                     page_documents.append(Document(page_content=data, metadata={"page_number":previous_page,"file_name": file_name,"has_table":True if table_data else False}))
                     
-                    if table_data:
-                        page_tables.append({"file_name": file_name,"page_number": previous_page, "table_html":[table_data]})
+                    tables = compact_tables(table_data,file_name,previous_page)
+                    if tables:
+                        page_tables[(file_name,previous_page)] = {"file_name": file_name,"page_number": previous_page, "tables":tables}
                     
                     page_data.clear()
                     tabular_data.clear()
@@ -75,8 +112,9 @@ class DocumentGenerator:
                 data = self.clean_data(' '.join(page_data))
                 page_documents.append(Document(page_content=data, metadata={"page_number":previous_page,"file_name": file_name,"has_table":True if table_data else False}))
                 
-                if table_data:
-                    page_tables.append({"file_name": file_name,"page_number": previous_page, "table_html":[table_data]})
+                tables = compact_tables(table_data,file_name,previous_page)
+                if tables:
+                    page_tables[(file_name,previous_page)] = {"file_name": file_name,"page_number": previous_page, "tables":tables}
                 
                 page_data.clear()
                 tabular_data.clear()
@@ -88,6 +126,104 @@ class DocumentGenerator:
             logging.error(f"Error while Cleaning Documents: {e} trace_back:{traceback.format_exc()}")
             raise Exception (f"Error: {e}")
 
+    def load_adaptive(self,file,file_name) -> list:
+        """
+        Loads page elements choosing a strategy per page: the pypdf text layer for plain text
+        pages, hi_res with table inference only for pages that look like tables, and OCR only
+        for scanned pages.
+
+        Parameters:
+        - file (str): The path of the PDF file.
+        - file_name (str): The name of the file being processed.
+
+        Returns:
+        List[Document]: Page elements ordered by page number, with a `parse_strategy` metadata.
+        """
+        return self.load_pages(file,file_name,plan_pages(file))
+
+    def load_pages(self,file,file_name,plan) -> list:
+        """
+        Loads the page elements of the pages in a plan, each with the strategy it was given.
+
+        Parameters:
+        - file (str): The path of the PDF file.
+        - file_name (str): The name of the file being processed.
+        - plan (list): Page analyses from `plan_pages`, possibly a subset of the pages.
+
+        Returns:
+        List[Document]: Page elements ordered by page number, with a `parse_strategy` metadata.
+        """
+        elements = []
+        strategy_seconds = {}
+
+        start = time.perf_counter()
+        for page in plan:
+            if page["strategy"] == "fast":
+                elements.append(Document(page_content=page["text"],metadata={"page_number":page["page_number"],"parse_strategy":"fast"}))
+        strategy_seconds["fast"] = time.perf_counter() - start
+
+        for strategy in ("hi_res","ocr_only"):
+            page_numbers = [page["page_number"] for page in plan if page["strategy"] == strategy]
+            if not page_numbers:
+                continue
+
+            start = time.perf_counter()
+            with tempfile.NamedTemporaryFile(suffix=".pdf",delete=True) as subset_file:
+                write_subset(file,page_numbers,subset_file.name)
+                if strategy == "hi_res":
+                    loader = UnstructuredPDFLoader(subset_file.name,mode="elements",strategy="hi_res",infer_table_structure=True)
+                else:
+                    loader = UnstructuredPDFLoader(subset_file.name,mode="elements",strategy="ocr_only")
+
+                for element in loader.load():
+                    # map the page number of the subset back to the original document
+                    subset_page = element.metadata.get("page_number") or 1
+                    element.metadata["page_number"] = page_numbers[subset_page-1]
+                    element.metadata["parse_strategy"] = strategy
+                    elements.append(element)
+            strategy_seconds[strategy] = time.perf_counter() - start
+
+        log_plan(file_name,plan,strategy_seconds)
+        elements.sort(key=lambda element: element.metadata.get("page_number"))
+        return elements
+
+    def plan_windows(self,file) -> list:
+        """
+        Splits a PDF into windows of consecutive pages for the streaming ingestion pipeline.
+
+        Parameters:
+        - file (str): The path of the PDF file.
+
+        Returns:
+        - list: One page plan per window, `window_pages` pages each.
+        """
+        if self.strategy == "adaptive":
+            plan = plan_pages(file)
+        else:
+            plan = [{"page_number":page_number,"strategy":"hi_res"} for page_number in range(1,len(PdfReader(file).pages)+1)]
+        return [plan[index:index+self.window_pages] for index in range(0,len(plan),self.window_pages)]
+
+    def generate_window(self,file,file_name,plan):
+        """
+        Parses, cleans and splits one window of pages.
+
+        Parameters:
+        - file (str): The path of the PDF file.
+        - file_name (str): The name of the file being processed.
+        - plan (list): The page plan of the window, from `plan_windows`.
+
+        Returns:
+        List[Document]: Cleaned and split documents of the window.
+        dict: Table index of the window keyed by (file_name, page_number).
+        """
+        try:
+            pdf_text_documents = self.load_pages(file,file_name,plan)
+            cleaned_pdf_documents,table_data = self.clean_merge_document(pdf_text_documents,file_name)
+            return self.split_documents(cleaned_pdf_documents),table_data
+        except Exception as e:
+            logging.error(f"Error while Generating Documents of pages {plan[0]['page_number']}-{plan[-1]['page_number']}: {e} trace_back:{traceback.format_exc()}")
+            raise Exception (f"Error: {e}")
+
     def generate_documents(self,file,file_name) -> list:
         """
         Generate and split documents from a PDF file.
@@ -98,14 +234,17 @@ class DocumentGenerator:
 
         Returns:
         List[Document]: List of cleaned and split documents.
+        dict: Table index of the file keyed by (file_name, page_number).
         """
         logging.info("Generating Documents")
         try:
-            pdf_loader = UnstructuredPDFLoader(file,mode="elements",strategy="hi_res",infer_table_structure=True)
-            pdf_text_documents = pdf_loader.load()
+            if self.strategy == "adaptive":
+                pdf_text_documents = self.load_adaptive(file,file_name)
+            else:
+                pdf_loader = UnstructuredPDFLoader(file,mode="elements",strategy="hi_res",infer_table_structure=True)
+                pdf_text_documents = pdf_loader.load()
             cleaned_pdf_documents,table_data = self.clean_merge_document(pdf_text_documents,file_name)
-            text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(chunk_size=300, chunk_overlap=30)
-            Splitted_docs = text_splitter.split_documents(cleaned_pdf_documents)
+            Splitted_docs = self.split_documents(cleaned_pdf_documents)
 
             logging.info("Documents Generated Successfully")
         
@@ -114,3 +253,52 @@ class DocumentGenerator:
             logging.error(f"Error while Generating Documents: {e} trace_back:{traceback.format_exc()}")
             raise Exception (f"Error: {e}")
 
+    def split_documents(self,documents) -> list:
+        """
+        Splits page documents into the chunks stored in the vector store.
+        """
+        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(chunk_size=300, chunk_overlap=30)
+        return text_splitter.split_documents(documents)
+
+    def generate_documents_from_azure(self,azure_result,file_name):
+        """
+        Generate and split documents from an Azure Document Intelligence result instead of
+        parsing the PDF locally.
+
+        Page text comes from the page spans over `content`, and tables from `tables` with their
+        `boundingRegions` page numbers, rendered to HTML like unstructured's `text_as_html`.
+
+        Parameters:
+        - azure_result (dict): The response of the Azure parser.
+        - file_name (str): The name of the file being processed.
+
+        Returns:
+        List[Document]: List of cleaned and split documents, or None when the result has no layout.
+        dict: Table index of the file keyed by (file_name, page_number).
+        """
+        logging.info("Generating Documents from Azure Result")
+        try:
+            result = find_analyze_result(azure_result)
+            if result is None:
+                logging.info(f"No layout in the Azure result of {file_name}")
+                return None,{}
+
+            texts = page_texts(result)
+            tables = page_tables(result)
+            page_documents = []
+            table_data = {}
+
+            for page_number,text in texts.items():
+                page_table_html = tables.get(page_number,[])
+                page_documents.append(Document(page_content=self.clean_data(text),metadata={"page_number":page_number,"file_name": file_name,"has_table":True if page_table_html else False,"parse_strategy":"azure"}))
+
+                compact = compact_tables(page_table_html,file_name,page_number)
+                if compact:
+                    table_data[(file_name,page_number)] = {"file_name": file_name,"page_number": page_number, "tables":compact}
+
+            logging.info("Documents Generated Successfully")
+            return self.split_documents(page_documents),table_data
+
+        except Exception as e:
+            logging.error(f"Error while Generating Documents from Azure Result: {e} trace_back:{traceback.format_exc()}")
+            raise Exception (f"Error: {e}")
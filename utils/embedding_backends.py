@@ -0,0 +1,130 @@
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+import logging
+import os
+import traceback
+
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+class SentenceTransformerBackend(Embeddings):
+    """
+    LangChain embeddings backed by a SentenceTransformer model running on CPU.
+
+    Supported backends:
+    - torch: the fp32 PyTorch model.
+    - torch-int8: the PyTorch model with its Linear layers dynamically quantized to int8.
+    - onnx: the model exported to ONNX and run with ONNX Runtime.
+    - onnx-int8: the ONNX export dynamically quantized to int8.
+
+    Attributes:
+    - batch_size: Number of chunks encoded per forward pass.
+    - threads: Intra-op thread count for torch / ONNX Runtime (0 keeps the library default).
+    """
+
+    def __init__(self, model_name, backend="torch", batch_size=32, threads=0,
+                 onnx_dir=".onnx_models", quantization_config="avx512_vnni"):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend}, expected one of {EMBEDDING_BACKENDS}")
+
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.threads = threads
+        self.onnx_dir = onnx_dir
+        self.quantization_config = quantization_config
+        self.model = self.load_model()
+
+    @property
+    def cache_name(self) -> str:
+        """
+        Model identifier used for cache keys, so vectors of different backends never mix.
+        """
+        return self.model_name if self.backend == "torch" else f"{self.model_name}:{self.backend}"
+
+    def onnx_session_kwargs(self) -> dict:
+        if not self.threads:
+            return {}
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = self.threads
+        return {"session_options": session_options}
+
+    def load_model(self):
+        """
+        Loads the SentenceTransformer for the configured backend.
+
+        Returns:
+        - SentenceTransformer: The model ready for `encode`.
+        """
+        logging.info(f"Loading {self.model_name} with the {self.backend} embedding backend")
+        try:
+            if self.backend in ("torch", "torch-int8"):
+                import torch
+                if self.threads:
+                    torch.set_num_threads(self.threads)
+
+                model = SentenceTransformer(self.model_name, device="cpu")
+                if self.backend == "torch-int8":
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                return model
+
+            if self.backend == "onnx":
+                return SentenceTransformer(self.model_name, device="cpu", backend="onnx",
+                                           model_kwargs=self.onnx_session_kwargs())
+
+            return self.load_quantized_onnx_model()
+
+        except Exception as e:
+            error_msg = "Error while Loading Embedding Backend:"
+            logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
+            raise Exception (f"{error_msg} {e}")
+
+    def load_quantized_onnx_model(self):
+        """
+        Exports and int8-quantizes the ONNX model once into `onnx_dir`, then loads the quantized file.
+        """
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        model_dir = os.path.join(self.onnx_dir, self.model_name.replace("/", "__"))
+        file_name = f"onnx/model_qint8_{self.quantization_config}.onnx"
+
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            logging.info(f"Exporting int8 ONNX model to {model_dir}")
+            onnx_model = SentenceTransformer(self.model_name, device="cpu", backend="onnx")
+            onnx_model.save(model_dir)
+            export_dynamic_quantized_onnx_model(onnx_model, self.quantization_config, model_dir)
+
+        model_kwargs = {"file_name": file_name, **self.onnx_session_kwargs()}
+        return SentenceTransformer(model_dir, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    def embed_documents(self, texts):
+        texts = [text.replace("\n", " ") for text in texts]
+        embeddings = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                       convert_to_numpy=True, show_progress_bar=False)
+        return embeddings.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_backend(model_name, backend=None, threads=None) -> SentenceTransformerBackend:
+    """
+    Builds an embedding backend from the environment configuration.
+
+    Parameters:
+    - model_name (str): HuggingFace model id.
+    - backend (str): Overrides EMBEDDING_BACKEND when given.
+    - threads (int): Overrides EMBEDDING_THREADS when given.
+
+    Returns:
+    - SentenceTransformerBackend: The configured backend.
+    """
+    return SentenceTransformerBackend(
+        model_name=model_name,
+        backend=backend or os.getenv("EMBEDDING_BACKEND", "torch"),
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+        threads=threads if threads is not None else int(os.getenv("EMBEDDING_THREADS", "0")),
+        onnx_dir=os.getenv("EMBEDDING_ONNX_DIR", ".onnx_models"),
+        quantization_config=os.getenv("EMBEDDING_QUANTIZATION_CONFIG", "avx512_vnni")
+    )
@@ -0,0 +1,113 @@
+"""
+Parity check and throughput benchmark for the embedding backends.
+
+Usage:
+    python -m utils.embedding_benchmark --backends torch torch-int8 onnx onnx-int8 --file lc.pdf
+"""
+from .embedding_backends import SentenceTransformerBackend, EMBEDDING_BACKENDS
+from pypdf import PdfReader
+import numpy as np
+import argparse
+import json
+import os
+import time
+
+MODEL_NAME = "BAAI/bge-large-en-v1.5"
+
+SAMPLE_CHUNKS = [
+    "irrevocable documentary credit number lc 2024 0153 issued subject to ucp 600",
+    "applicant global textiles ltd beneficiary sunrise garments co karachi pakistan",
+    "amount usd 125 , 000 . 00 tolerance plus minus 5 percent cif hamburg incoterms 2020",
+    "latest date of shipment 15 march 2024 expiry date 31 march 2024 place of expiry germany",
+    "documents required signed commercial invoice in 3 originals full set clean on board bills of lading",
+    "invoice number inv 7781 date 02 march 2024 description cotton t shirts 12 , 500 pcs unit price 10 . 00",
+    "partial shipments allowed transhipment not allowed port of loading karachi port of discharge hamburg",
+    "additional conditions all documents must indicate the credit number and the date of issue",
+]
+
+
+def load_chunks(file=None, chunk_words=200) -> list:
+    """
+    Loads benchmark chunks from a PDF text layer, falling back to built in LC / invoice samples.
+
+    Parameters:
+    - file (str): Optional path to a PDF.
+    - chunk_words (int): Words per chunk when splitting the PDF text.
+
+    Returns:
+    - list: Chunk strings.
+    """
+    if not file:
+        return SAMPLE_CHUNKS * 16
+
+    words = []
+    for page in PdfReader(file).pages:
+        words.extend((page.extract_text() or "").split())
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)] or SAMPLE_CHUNKS
+
+
+def parity_check(backend, reference, texts) -> dict:
+    """
+    Compares a backend's embeddings with the fp32 reference using cosine similarity.
+
+    Parameters:
+    - backend (SentenceTransformerBackend): Backend under test.
+    - reference (np.ndarray): fp32 embeddings of the same texts (normalized).
+    - texts (list): Chunks to embed.
+
+    Returns:
+    - dict: Mean and minimum cosine agreement.
+    """
+    candidate = np.asarray(backend.embed_documents(texts), dtype=np.float32)
+    cosine = np.sum(candidate * reference, axis=1) / (
+        np.linalg.norm(candidate, axis=1) * np.linalg.norm(reference, axis=1))
+    return {"mean_cosine": float(cosine.mean()), "min_cosine": float(cosine.min())}
+
+
+def throughput(backend, texts, repeats=3) -> float:
+    """
+    Measures encode throughput of a backend.
+
+    Parameters:
+    - backend (SentenceTransformerBackend): Backend under test.
+    - texts (list): Chunks to embed.
+    - repeats (int): Number of timed passes after one warm up pass.
+
+    Returns:
+    - float: Chunks per second.
+    """
+    backend.embed_documents(texts[:backend.batch_size])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        backend.embed_documents(texts)
+    return len(texts) * repeats / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend parity check and throughput benchmark")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--file", help="PDF used to build benchmark chunks")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("EMBEDDING_THREADS", "0")))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = load_chunks(args.file)
+    reference_backend = SentenceTransformerBackend(MODEL_NAME, "torch", args.batch_size, args.threads)
+    reference = np.asarray(reference_backend.embed_documents(texts), dtype=np.float32)
+
+    report = {}
+    for name in args.backends:
+        backend = reference_backend if name == "torch" else SentenceTransformerBackend(
+            MODEL_NAME, name, args.batch_size, args.threads,
+            onnx_dir=os.getenv("EMBEDDING_ONNX_DIR", ".onnx_models"),
+            quantization_config=os.getenv("EMBEDDING_QUANTIZATION_CONFIG", "avx512_vnni"))
+        report[name] = {**parity_check(backend, reference, texts),
+                        "chunks_per_sec": throughput(backend, texts, args.repeats),
+                        "batch_size": args.batch_size, "threads": args.threads}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
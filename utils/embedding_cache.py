@@ -0,0 +1,310 @@
+from langchain_core.embeddings import Embeddings
+from collections import OrderedDict
+import numpy as np
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+import unicodedata
+
+# Slots the disk tier starts with; it doubles when they are used, up to max_disk_items
+DISK_GROWTH_ITEMS = 4096
+
+
+def normalize_text(text) -> str:
+    """
+    Normalizes chunk text so that cosmetic differences do not produce new cache keys.
+
+    Parameters:
+    - text (str): Raw chunk text.
+
+    Returns:
+    - str: NFKC normalized text with collapsed whitespace.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class EmbeddingCache:
+    """
+    Content addressed embedding cache with an in-memory LRU tier and a persistent disk tier.
+
+    Keys are the SHA-256 of the model name plus the normalized text. The disk tier stores the
+    vectors in a memory-mapped float32 array with a small JSON key index next to it, and evicts
+    the least recently used slots once it holds `max_disk_items` vectors. The array starts with
+    DISK_GROWTH_ITEMS slots and doubles as they fill, so its size follows what is cached.
+
+    The key index is written every `flush_items` new vectors or `flush_seconds`, and on
+    `close`, not on every put; lookups only wait for the copy of the index, not the write. Each slot also stores a fingerprint of its key next to the
+    vector, so an index older than the vectors (after a crash) cannot return the wrong vector.
+
+    Attributes:
+    - stats: Hit, miss and eviction counters for both tiers.
+    """
+
+    def __init__(self, model_name, cache_dir, max_memory_items=10000, max_disk_items=200000,
+                 flush_items=1000, flush_seconds=30.0):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0, "disk_evictions": 0}
+
+        self.flush_items = flush_items
+        self.flush_seconds = flush_seconds
+        self.pending_writes = 0
+        self.last_flush = time.monotonic()
+
+        self.vectors = None
+        self.fingerprints = None
+        self.dimension = None
+        self.rows = 0
+        self.index = OrderedDict()
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.fingerprints_path = os.path.join(cache_dir, "keys.u64")
+        self.load_disk_tier()
+
+    def key(self, text, namespace="document") -> str:
+        """
+        Builds the cache key of a text for the configured model.
+
+        Parameters:
+        - text (str): Chunk or query text.
+        - namespace (str): Separates document and query embeddings.
+
+        Returns:
+        - str: Hex SHA-256 digest.
+        """
+        payload = f"{self.model_name}\x00{namespace}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def fingerprint(key) -> int:
+        return int(key[:16], 16)
+
+    def load_disk_tier(self):
+        """
+        Opens the memory-mapped vectors and the key index if they exist on disk.
+        """
+        try:
+            if not all(os.path.exists(path) for path in (self.index_path, self.vectors_path, self.fingerprints_path)):
+                return
+
+            with open(self.index_path) as index_file:
+                meta = json.load(index_file)
+
+            if meta.get("model_name") != self.model_name or meta.get("capacity") != self.max_disk_items:
+                logging.info("Embedding cache configuration changed, starting with an empty disk tier")
+                return
+
+            self.dimension = meta["dimension"]
+            rows = min(os.path.getsize(self.vectors_path) // (4 * self.dimension),
+                       os.path.getsize(self.fingerprints_path) // 8)
+            self.index = OrderedDict((key, slot) for key, slot in meta["index"].items() if slot < rows)
+            self.map_files(rows)
+            logging.info(f"Embedding cache loaded with {len(self.index)} vectors")
+        except Exception as e:
+            logging.error(f"Error while Loading Embedding Cache: {e} trace_back:{traceback.format_exc()}")
+            self.vectors = None
+            self.fingerprints = None
+            self.dimension = None
+            self.rows = 0
+            self.index = OrderedDict()
+
+    def map_files(self, rows):
+        """
+        Maps the first `rows` slots of the vectors and fingerprints files, extending the files
+        when they are shorter.
+        """
+        self.vectors = self.fingerprints = None
+        for path, row_bytes in ((self.vectors_path, 4 * self.dimension), (self.fingerprints_path, 8)):
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as mapped_file:
+                if os.path.getsize(path) < rows * row_bytes:
+                    mapped_file.truncate(rows * row_bytes)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dimension))
+        self.fingerprints = np.memmap(self.fingerprints_path, dtype=np.uint64, mode="r+", shape=(rows,))
+        self.rows = rows
+
+    def open_vectors(self, dimension):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for path in (self.vectors_path, self.fingerprints_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dimension = dimension
+        self.index = OrderedDict()
+        self.map_files(min(DISK_GROWTH_ITEMS, self.max_disk_items))
+
+    def grow(self, slot):
+        self.vectors.flush()
+        self.fingerprints.flush()
+        rows = self.rows
+        while rows <= slot:
+            rows *= 2
+        self.map_files(min(rows, self.max_disk_items))
+
+    def flush(self):
+        """
+        Persists the memory-mapped vectors and the key index. The index is copied under the
+        lock and written after it is released.
+        """
+        with self.flush_lock:
+            with self.lock:
+                if self.vectors is None:
+                    return
+                self.vectors.flush()
+                self.fingerprints.flush()
+                meta = {"model_name": self.model_name, "capacity": self.max_disk_items,
+                        "dimension": self.dimension, "index": dict(self.index)}
+                self.pending_writes = 0
+                self.last_flush = time.monotonic()
+
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, "w") as index_file:
+                json.dump(meta, index_file)
+            os.replace(temp_path, self.index_path)
+
+    def close(self):
+        """
+        Writes the vectors and the key index not persisted yet, at shutdown.
+        """
+        try:
+            if self.pending_writes:
+                self.flush()
+        except Exception as e:
+            logging.error(f"Error while Writing Embedding Cache: {e} trace_back:{traceback.format_exc()}")
+
+    def remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_items:
+            self.memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def free_slot(self) -> int:
+        if len(self.index) < self.max_disk_items:
+            return len(self.index)
+
+        slot = self.index.popitem(last=False)[1]
+        self.stats["disk_evictions"] += 1
+        return slot
+
+    def get_many(self, keys) -> list:
+        """
+        Looks up vectors for a list of keys, memory tier first and disk tier second.
+
+        Parameters:
+        - keys (list): Keys built with `key()`.
+
+        Returns:
+        - list: A vector (list of floats) or None for every key.
+        """
+        results = []
+        with self.lock:
+            for key in keys:
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                elif key in self.index and self.fingerprints[self.index[key]] == self.fingerprint(key):
+                    self.index.move_to_end(key)
+                    vector = self.vectors[self.index[key]].tolist()
+                    self.remember(key, vector)
+                    self.stats["disk_hits"] += 1
+                else:
+                    self.stats["misses"] += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, keys, vectors):
+        """
+        Stores vectors in both tiers, evicting the least recently used disk slots when full.
+
+        Parameters:
+        - keys (list): Keys built with `key()`.
+        - vectors (list): One embedding per key.
+        """
+        if not keys:
+            return
+        try:
+            with self.lock:
+                if self.vectors is None:
+                    self.open_vectors(len(vectors[0]))
+
+                for key, vector in zip(keys, vectors):
+                    self.remember(key, vector)
+                    if key in self.index:
+                        self.index.move_to_end(key)
+                        continue
+                    slot = self.free_slot()
+                    if slot >= self.rows:
+                        self.grow(slot)
+                    self.vectors[slot] = np.asarray(vector, dtype=np.float32)
+                    self.fingerprints[slot] = self.fingerprint(key)
+                    self.index[key] = slot
+                    self.pending_writes += 1
+
+                flush_due = self.pending_writes >= self.flush_items or (
+                    self.pending_writes and time.monotonic() - self.last_flush >= self.flush_seconds)
+            if flush_due:
+                self.flush()
+        except Exception as e:
+            logging.error(f"Error while Writing Embedding Cache: {e} trace_back:{traceback.format_exc()}")
+
+    def get_stats(self) -> dict:
+        """
+        Returns the hit/miss counters along with the current size of each tier.
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memory_items"] = len(self.memory)
+            stats["disk_items"] = len(self.index)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            return stats
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain embeddings wrapper that serves repeated chunks from an EmbeddingCache and only
+    sends the misses to the underlying model.
+    """
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for position, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[position], position)
+
+        if missing:
+            logging.info(f"Embedding cache: encoding {len(missing)} of {len(texts)} chunks")
+            missing_keys = list(missing)
+            computed = self.embeddings.embed_documents([texts[missing[key]] for key in missing_keys])
+            self.cache.put_many(missing_keys, computed)
+            computed_by_key = dict(zip(missing_keys, computed))
+            vectors = [vector if vector is not None else computed_by_key[key]
+                       for key, vector in zip(keys, vectors)]
+
+        return vectors
+
+    def embed_query(self, text):
+        key = self.cache.key(text, namespace="query")
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many([key], [vector])
+        return vector
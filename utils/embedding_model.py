@@ -1,27 +1,61 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+from .embedding_backends import load_backend
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from .embedding_pool import EmbeddingPool, PooledEmbeddings
 import logging
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
-os.environ["TOKENIZERS_PARALLELISM"] = os.getenv("parallel_token")
+os.environ["TOKENIZERS_PARALLELISM"] = os.getenv("parallel_token", "false")
 
 class EmbeddingModel():
     """
     A singleton class that instantiates and provides access to a BAAI embedding model.
     This class ensures that only one instance of the HuggingFaceBgeEmbeddings model.
-    
+    The backend (torch, torch-int8, onnx, onnx-int8), batch size and thread count are selected
+    with EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE and EMBEDDING_THREADS.
+    With EMBEDDING_POOL_WORKERS set, batches of at least EMBEDDING_POOL_MIN_BATCH chunks are sharded
+    across a persistent process pool.
+    The model is wrapped in a content addressed embedding cache unless EMBEDDING_CACHE is "false".
+
     Attributes:
     - model_instance: Stores the single instance of the embedding model.
+    - cache: The EmbeddingCache in front of the model, or None when disabled.
+    - pool: The EmbeddingPool used for large batches, or None when disabled.
     """
-    model_instance = None 
+    model_instance = None
+    cache = None
+    pool = None
 
     def __new__(cls,*args,**kwargs):
 
         if cls.model_instance is None:
             logging.info("Embedding Model Loading")
             model_name = "BAAI/bge-large-en-v1.5"
-            model_kwargs = {'device': 'cpu'}
-            encode_kwargs = {'normalize_embeddings': True}
-            cls.model_instance = HuggingFaceEmbeddings(model_name=model_name,model_kwargs=model_kwargs,encode_kwargs=encode_kwargs)
-        return cls.model_instance
\ No newline at end of file
+            model = load_backend(model_name)
+            cache_name = model.cache_name
+
+            pool_workers = int(os.getenv("EMBEDDING_POOL_WORKERS", "0"))
+            if pool_workers > 0:
+                cls.pool = EmbeddingPool(
+                    model_name=model_name,
+                    backend=model.backend,
+                    workers=pool_workers,
+                    threads_per_worker=int(os.getenv("EMBEDDING_POOL_THREADS", "0")),
+                    shard_size=model.batch_size
+                )
+                model = PooledEmbeddings(model, cls.pool, int(os.getenv("EMBEDDING_POOL_MIN_BATCH", "64")))
+
+            if os.getenv("EMBEDDING_CACHE", "true").lower() == "true":
+                cls.cache = EmbeddingCache(
+                    model_name=cache_name,
+                    cache_dir=os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache"),
+                    max_memory_items=int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000")),
+                    max_disk_items=int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "200000")),
+                    flush_items=int(os.getenv("EMBEDDING_CACHE_FLUSH_ITEMS", "1000")),
+                    flush_seconds=float(os.getenv("EMBEDDING_CACHE_FLUSH_SECONDS", "30"))
+                )
+                model = CachedEmbeddings(model, cls.cache)
+
+            cls.model_instance = model
+        return cls.model_instance
@@ -0,0 +1,108 @@
+from langchain_core.embeddings import Embeddings
+from concurrent.futures import ProcessPoolExecutor
+from .embedding_backends import load_backend
+import multiprocessing
+import logging
+import atexit
+import math
+import os
+import threading
+import traceback
+
+worker_backend = None
+
+
+def init_worker(model_name, backend, threads):
+    """
+    Loads the embedding backend once in a pool worker process.
+    """
+    global worker_backend
+    worker_backend = load_backend(model_name, backend, threads)
+
+
+def encode_shard(texts) -> list:
+    return worker_backend.embed_documents(texts)
+
+
+class EmbeddingPool:
+    """
+    A persistent process pool that shards chunk lists across workers which each keep their own
+    copy of the embedding model loaded.
+
+    The pool is started lazily on the first large batch and lives until the process exits.
+    """
+
+    def __init__(self, model_name, backend, workers, threads_per_worker=0, shard_size=32):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.shard_size = shard_size
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.executor is None:
+                logging.info(f"Starting embedding pool with {self.workers} workers")
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    initargs=(self.model_name, self.backend, self.threads_per_worker)
+                )
+                atexit.register(self.shutdown)
+        return self.executor
+
+    def encode(self, texts) -> list:
+        """
+        Encodes texts across the pool workers.
+
+        Parameters:
+        - texts (list): Chunk strings.
+
+        Returns:
+        - list: One vector per text, in input order.
+        """
+        try:
+            executor = self.start()
+            shard_size = max(self.shard_size, math.ceil(len(texts) / self.workers))
+            shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+
+            vectors = []
+            for shard_vectors in executor.map(encode_shard, shards):
+                vectors.extend(shard_vectors)
+            return vectors
+
+        except Exception as e:
+            error_msg = "Error while Encoding in Embedding Pool:"
+            logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
+            raise Exception (f"{error_msg} {e}")
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+
+class PooledEmbeddings(Embeddings):
+    """
+    LangChain embeddings that send large chunk lists to an EmbeddingPool and encode small ones
+    and queries in process, so single page uploads keep their latency.
+    """
+
+    def __init__(self, embeddings, pool, min_pool_batch=64):
+        self.embeddings = embeddings
+        self.pool = pool
+        self.min_pool_batch = min_pool_batch
+
+    def embed_documents(self, texts):
+        if len(texts) < self.min_pool_batch:
+            return self.embeddings.embed_documents(texts)
+
+        logging.info(f"Encoding {len(texts)} chunks in the embedding pool")
+        return self.pool.encode(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+import asyncio
+import logging
+import os
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+# Work class -> (executor type, default concurrency). Override with EXECUTOR_<CLASS>_WORKERS.
+# Remote parser calls use the async client in api/http_client.py, bounded by PARSER_POOL_SIZE.
+WORK_CLASSES = {
+    "local_parse": ("process", 2),
+    "embed": ("thread", 1),
+    "llm": ("thread", 8),
+}
+
+executors = {}
+executors_lock = threading.Lock()
+
+
+def work_class_limit(work_class) -> int:
+    """
+    Returns the configured concurrency limit of a work class.
+    """
+    default = WORK_CLASSES[work_class][1]
+    return int(os.getenv(f"EXECUTOR_{work_class.upper()}_WORKERS", default))
+
+
+def get_executor(work_class):
+    """
+    Returns the bounded executor of a work class, creating it on first use.
+
+    Parameters:
+    - work_class (str): One of "local_parse", "embed" or "llm".
+
+    Returns:
+    - Executor: A thread pool, or a process pool for CPU-bound local parsing.
+    """
+    if work_class not in WORK_CLASSES:
+        raise ValueError(f"Unknown work class {work_class}")
+
+    with executors_lock:
+        if work_class not in executors:
+            limit = work_class_limit(work_class)
+            logging.info(f"Starting {work_class} executor with {limit} workers")
+            if WORK_CLASSES[work_class][0] == "process":
+                executors[work_class] = ProcessPoolExecutor(max_workers=limit,
+                                                            mp_context=multiprocessing.get_context("spawn"))
+            else:
+                executors[work_class] = ThreadPoolExecutor(max_workers=limit, thread_name_prefix=work_class)
+        return executors[work_class]
+
+
+async def run_blocking(work_class, func, *args, **kwargs):
+    """
+    Runs a blocking call on the executor of its work class without blocking the event loop.
+
+    Parameters:
+    - work_class (str): Work class deciding which bounded executor runs the call.
+    - func (callable): The blocking function. Must be picklable for process pools.
+
+    Returns:
+    - The return value of `func`.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(work_class), partial(func, *args, **kwargs))
+
+
+def shutdown_executors():
+    with executors_lock:
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        executors.clear()
@@ -0,0 +1,510 @@
+from .azure_layout import find_analyze_result
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from difflib import SequenceMatcher
+import calendar
+import os
+import re
+from dotenv import load_dotenv
+load_dotenv()
+
+MATCH = "match"
+DISCREPANCY = "discrepancy"
+AMBIGUOUS = "ambiguous"
+MISSING = "missing"
+
+# Party names at or above NAME_MATCH similarity match, at or below NAME_MISMATCH they differ
+NAME_MATCH = float(os.getenv("COMPARISON_NAME_MATCH", "0.9"))
+NAME_MISMATCH = float(os.getenv("COMPARISON_NAME_MISMATCH", "0.6"))
+
+# Field labels in order of preference, compared after `normalize_label`. SWIFT MT700 tags are
+# matched exactly, longer labels as the whole field name or its leading or trailing words.
+LC_FIELDS = {
+    "lc_number": ["documentary credit number", "letter of credit number", "credit number", "lc number", "lc no", "20"],
+    "amount": ["currency code amount", "credit amount", "lc amount", "32b", "amount"],
+    "tolerance": ["percentage credit amount tolerance", "amount tolerance", "tolerance", "39a"],
+    "expiry_date": ["date and place of expiry", "expiry date", "date of expiry", "31d", "expiry"],
+    "latest_shipment_date": ["latest date of shipment", "latest shipment date", "latest shipment", "44c"],
+    "beneficiary": ["beneficiary name", "beneficiary", "59"],
+    "applicant": ["applicant name", "applicant", "50"],
+}
+
+INVOICE_FIELDS = {
+    "amount": ["invoice total", "total amount", "amount due", "grand total", "total", "sub total"],
+    "invoice_date": ["invoice date", "date of invoice", "dated"],
+    "shipment_date": ["date of shipment", "shipment date", "ship date", "on board date", "bill of lading date"],
+    "seller": ["vendor name", "seller", "exporter", "shipper", "beneficiary", "remit to name"],
+    "buyer": ["customer name", "buyer", "importer", "consignee", "applicant", "billing address recipient", "bill to"],
+}
+
+# Regions of the analyze result that hold layout rather than fields
+LAYOUT_KEYS = {"pages", "paragraphs", "tables", "styles", "lines", "words", "spans", "boundingRegions",
+               "bounding_regions", "sections", "figures", "selectionMarks", "content", "polygon"}
+
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
+CURRENCY_PATTERN = re.compile(r"(?<![A-Z])(USD|EUR|GBP|JPY|CNY|INR|PKR|AED|SAR|CHF|AUD|CAD|SGD|HKD)(?![A-Z])")
+# Space or apostrophe thousands groups must be three digits, so "3 1,500.00" stays two numbers
+AMOUNT_PATTERN = re.compile(r"\d{1,3}(?:[ ']\d{3})+(?:[.,]\d+)?(?!\d)|\d[\d,.]*\d|\d")
+INCOTERMS_PATTERN = re.compile(r"\b(EXW|FCA|FAS|FOB|CFR|CIF|CPT|CIP|DAP|DPU|DAT|DDP|C&F|CNF)\b")
+LEGAL_SUFFIXES = {"ltd", "limited", "llc", "inc", "incorporated", "co", "corp", "corporation", "company",
+                  "pvt", "private", "plc", "gmbh", "ag", "sa", "srl", "bv", "pte", "the"}
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+
+
+def normalize_label(label) -> str:
+    """
+    Lowercases a field name and splits camel case, acronyms ("LCAmount") and punctuation into
+    single spaces.
+    """
+    label = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", str(label))
+    label = re.sub(r"([a-z])([A-Z])", r"\1 \2", label)
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", label.lower()).split())
+
+
+def field_value(field):
+    """
+    Returns the typed value of an Azure field (valueCurrency, valueDate, valueString, ...),
+    falling back to its content.
+    """
+    if not isinstance(field, dict):
+        return field
+
+    for key, value in field.items():
+        compact = key.replace("_", "").lower()
+        if not compact.startswith("value") or compact == "valuetype" or value in (None, "", [], {}):
+            continue
+        if compact == "valuecurrency" and isinstance(value, dict):
+            return {"amount": value.get("amount"),
+                    "currency": value.get("currencyCode") or value.get("currency_code") or value.get("currencySymbol")}
+        if compact == "valueobject" and isinstance(value, dict):
+            return {normalize_label(name): field_value(item) for name, item in value.items()}
+        if compact == "valuearray" and isinstance(value, list):
+            return [field_value(item) for item in value]
+        if compact == "valueaddress":
+            return field.get("content") or value
+        return value
+    return field.get("content")
+
+
+def flatten_fields(data) -> dict:
+    """
+    Collects the extracted fields of a parser response as a flat mapping of normalized label
+    to typed value. Reads Azure `fields`, `keyValuePairs` and plain scalar entries.
+
+    Parameters:
+    - data (dict): The parser response.
+
+    Returns:
+    - dict: Normalized field label mapped to its value, first occurrence wins.
+    """
+    fields = {}
+
+    def visit(node, depth):
+        if depth > 6:
+            return
+        if isinstance(node, list):
+            for item in node:
+                visit(item, depth + 1)
+            return
+        if not isinstance(node, dict):
+            return
+
+        if isinstance(node.get("fields"), dict):
+            for name, field in node["fields"].items():
+                fields.setdefault(normalize_label(name), field_value(field))
+
+        for pair in node.get("keyValuePairs") or node.get("key_value_pairs") or []:
+            key = (pair.get("key") or {}).get("content")
+            value = (pair.get("value") or {}).get("content")
+            if key and value:
+                fields.setdefault(normalize_label(key), value)
+
+        for key, value in node.items():
+            if key in LAYOUT_KEYS or key in ("fields", "keyValuePairs", "key_value_pairs"):
+                continue
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                fields.setdefault(normalize_label(key), value)
+            else:
+                visit(value, depth + 1)
+
+    visit(data, 0)
+    return fields
+
+
+def document_text(data, fields) -> str:
+    """
+    Returns the document content, when the response carries it, and the field values as one
+    text for pattern based lookups.
+    """
+    result = find_analyze_result(data) or {}
+    content = result.get("content") or (data.get("content") if isinstance(data, dict) else "") or ""
+    values = " \n".join(str(value) for value in fields.values())
+    return f"{content}\n{values}"
+
+
+def label_matches(label, wanted) -> bool:
+    """
+    A field label matches an alias when it is the alias, or starts or ends with it as whole
+    words ("32b currency code amount"); SWIFT tags and other short aliases match exactly.
+    """
+    if label == wanted:
+        return True
+    return len(wanted) > 3 and (label.startswith(f"{wanted} ") or label.endswith(f" {wanted}"))
+
+
+def find_field(fields, labels, exclude=()):
+    """
+    Returns the (label, value) of the first field matching one of `labels`, or (None, None).
+    Fields matching one of the `exclude` aliases are skipped, e.g. the tolerance when looking
+    for the amount.
+    """
+    for wanted in labels:
+        for label, value in fields.items():
+            if value in (None, "", [], {}):
+                continue
+            if label_matches(label, wanted) and not any(label_matches(label, other) for other in exclude):
+                return label, value
+    return None, None
+
+
+def parse_amount(value):
+    """
+    Parses an amount and its currency from an Azure currency value, a number or a text such as
+    "USD 12,345.67", "EUR 12.345,67" or the SWIFT form "USD12345,67".
+
+    Returns:
+    - tuple: (Decimal or None, currency code or None)
+    """
+    if isinstance(value, dict):
+        amount, _ = parse_amount(value.get("amount"))
+        return amount, value.get("currency")
+    if isinstance(value, bool) or value is None:
+        return None, None
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value)), None
+
+    text = str(value)
+    currency_span = None
+    currency = None
+    currency_match = CURRENCY_PATTERN.search(text.upper())
+    if currency_match:
+        currency, currency_span = currency_match.group(1), currency_match.span()
+    else:
+        for symbol, code in CURRENCY_SYMBOLS.items():
+            if symbol in text:
+                currency, currency_span = code, (text.index(symbol), text.index(symbol) + len(symbol))
+                break
+
+    # The number next to the currency, else the first formatted one, else the longest,
+    # so counts such as "Total 3 items 1,500.00" are not read as the amount
+    candidates = list(AMOUNT_PATTERN.finditer(text))
+    if not candidates:
+        return None, currency
+    next_to_currency = [match for match in candidates if currency_span and (
+        (match.start() >= currency_span[1] and not text[currency_span[1]:match.start()].strip()) or
+        (match.end() <= currency_span[0] and not text[match.end():currency_span[0]].strip()))]
+    formatted = [match for match in candidates if re.search(r"[,.' ]", match.group(0))]
+    number_match = (next_to_currency or formatted or [max(candidates, key=lambda match: len(match.group(0)))])[0]
+    number = re.sub(r"[ ']", "", number_match.group(0))
+
+    if "," in number and "." in number:
+        decimal_mark = "," if number.rfind(",") > number.rfind(".") else "."
+    elif "," in number:
+        # SWIFT amounts and European notation use the comma for decimals
+        decimal_mark = "," if number.count(",") == 1 and len(number) - number.rfind(",") - 1 != 3 else ""
+    elif number.count(".") == 1:
+        decimal_mark = "."
+    else:
+        decimal_mark = ""
+
+    thousands_mark = {",": ".", ".": ",", "": ",."}[decimal_mark]
+    for mark in thousands_mark:
+        number = number.replace(mark, "")
+    number = number.replace(",", ".")
+    try:
+        return Decimal(number), currency
+    except InvalidOperation:
+        return None, currency
+
+
+def parse_tolerance(value):
+    """
+    Parses an LC amount tolerance such as "10/10" (SWIFT 39A), "+/- 5%" or "5 PCT".
+
+    Returns:
+    - tuple: (plus, minus) as fractions, or None when the value has no tolerance.
+    """
+    if value is None:
+        return None
+    text = str(value)
+    swift = re.search(r"(\d{1,2})\s*/\s*(\d{1,2})", text)
+    if swift:
+        return Decimal(swift.group(1)) / 100, Decimal(swift.group(2)) / 100
+    percent = re.search(r"(\d+(?:[.,]\d+)?)\s*(?:%|PCT|PERCENT)", text.upper())
+    if percent:
+        fraction = Decimal(percent.group(1).replace(",", ".")) / 100
+        return fraction, fraction
+    return None
+
+
+def valid_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_date(value):
+    """
+    Parses a date from an Azure date value or a text in ISO, day first, month name or SWIFT
+    YYMMDD form (e.g. "250630 IN SINGAPORE" in field 31D).
+
+    Returns:
+    - date: The parsed date, or None.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+
+    text = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", value.replace(",", " "))
+
+    iso = re.search(r"\b(\d{4})-(\d{1,2})-(\d{1,2})", text)
+    if iso:
+        return valid_date(int(iso.group(1)), int(iso.group(2)), int(iso.group(3)))
+
+    day_month = re.search(r"\b(\d{1,2})[\s.-]+([A-Za-z]{3,9})\.?[\s.-]+(\d{2,4})\b", text)
+    month_day = re.search(r"\b([A-Za-z]{3,9})\.?\s+(\d{1,2})\s+(\d{4})\b", text)
+    for match, (day, month, year) in ((day_month, (1, 2, 3)), (month_day, (2, 1, 3))):
+        if match and match.group(month).lower() in MONTHS:
+            year_value = int(match.group(year))
+            year_value += 2000 if year_value < 100 else 0
+            parsed = valid_date(year_value, MONTHS[match.group(month).lower()], int(match.group(day)))
+            if parsed:
+                return parsed
+
+    numeric = re.search(r"\b(\d{1,4})[/.-](\d{1,2})[/.-](\d{2,4})\b", text)
+    if numeric:
+        first, second, third = (int(part) for part in numeric.groups())
+        if len(numeric.group(1)) == 4:
+            return valid_date(first, second, third)
+        third += 2000 if third < 100 else 0
+        # Trade documents are mostly day first, month first is the fallback
+        return valid_date(third, second, first) or valid_date(third, first, second)
+
+    swift = re.search(r"\b(\d{2})(\d{2})(\d{2})\b", text)
+    if swift:
+        return valid_date(2000 + int(swift.group(1)), int(swift.group(2)), int(swift.group(3)))
+    return None
+
+
+def normalize_name(name) -> str:
+    """
+    Keeps the first line of a party, lowercased, without punctuation and legal suffixes.
+    """
+    first_line = str(name).strip().splitlines()[0] if str(name).strip() else ""
+    tokens = re.sub(r"[^a-z0-9]+", " ", first_line.lower()).split()
+    return " ".join(token for token in tokens if token not in LEGAL_SUFFIXES)
+
+
+def name_similarity(first, second) -> float:
+    """
+    Similarity of two party names between 0 and 1, insensitive to word order and legal suffixes.
+    """
+    first, second = normalize_name(first), normalize_name(second)
+    if not first or not second:
+        return 0.0
+    direct = SequenceMatcher(None, first, second).ratio()
+    sorted_tokens = SequenceMatcher(None, " ".join(sorted(first.split())), " ".join(sorted(second.split()))).ratio()
+    return max(direct, sorted_tokens)
+
+
+def result(field, status, lc_value=None, invoice_value=None, detail=""):
+    return {"field": field, "status": status, "lc_value": serialize(lc_value),
+            "invoice_value": serialize(invoice_value), "detail": detail}
+
+
+def serialize(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return str(value)
+    return value
+
+
+def compare_amount(lc_fields, invoice_fields) -> list:
+    """
+    Checks the invoice amount against the LC amount plus its tolerance, and the currencies.
+    "About" or "approximately" before the LC amount allows 10% either way (UCP 600 article 30).
+    """
+    lc_label, lc_raw = find_field(lc_fields, LC_FIELDS["amount"], exclude=LC_FIELDS["tolerance"])
+    _, invoice_raw = find_field(invoice_fields, INVOICE_FIELDS["amount"])
+    lc_amount, lc_currency = parse_amount(lc_raw)
+    invoice_amount, invoice_currency = parse_amount(invoice_raw)
+
+    results = []
+    if lc_currency and invoice_currency:
+        status = MATCH if lc_currency.upper() == invoice_currency.upper() else DISCREPANCY
+        results.append(result("currency", status, lc_currency, invoice_currency))
+    else:
+        results.append(result("currency", MISSING, lc_currency, invoice_currency,
+                              "Currency not found on both documents"))
+
+    if lc_amount is None or invoice_amount is None:
+        results.append(result("amount", MISSING, lc_amount, invoice_amount, "Amount not found on both documents"))
+        return results
+
+    _, tolerance_raw = find_field(lc_fields, LC_FIELDS["tolerance"])
+    tolerance = parse_tolerance(tolerance_raw)
+    if tolerance is None and re.search(r"\b(ABOUT|APPROXIMATELY|CIRCA)\b", f"{lc_label} {lc_raw}".upper()):
+        tolerance = (Decimal("0.10"), Decimal("0.10"))
+    plus, minus = tolerance or (Decimal(0), Decimal(0))
+
+    upper = lc_amount * (1 + plus)
+    if invoice_amount <= upper:
+        detail = f"Within the LC amount{f' plus {(plus * 100).normalize():f}% tolerance' if plus else ''}"
+        if invoice_amount < lc_amount * (1 - minus):
+            detail += ", below the LC amount (partial drawing)"
+        results.append(result("amount", MATCH, lc_amount, invoice_amount, detail))
+    else:
+        results.append(result("amount", DISCREPANCY, lc_amount, invoice_amount,
+                              f"Exceeds the LC amount by {invoice_amount - upper:,.2f}"))
+    return results
+
+
+def compare_party(field, lc_fields, lc_labels, invoice_fields, invoice_labels) -> dict:
+    """
+    Fuzzy matches an LC party against the invoice party expected to carry the same name.
+    """
+    _, lc_name = find_field(lc_fields, lc_labels)
+    _, invoice_name = find_field(invoice_fields, invoice_labels)
+    if not lc_name or not invoice_name:
+        return result(field, MISSING, lc_name, invoice_name, "Party not found on both documents")
+
+    similarity = name_similarity(lc_name, invoice_name)
+    if similarity >= NAME_MATCH:
+        status = MATCH
+    elif similarity <= NAME_MISMATCH:
+        status = DISCREPANCY
+    else:
+        status = AMBIGUOUS
+    return result(field, status, lc_name, invoice_name, f"Name similarity {similarity:.2f}")
+
+
+def compare_lc_number(lc_fields, invoice_fields, invoice_text) -> dict:
+    """
+    Looks for the LC number in the invoice fields and content, ignoring spaces and separators.
+    """
+    _, lc_number = find_field(lc_fields, LC_FIELDS["lc_number"])
+    if not lc_number:
+        return result("lc_number", MISSING, None, None, "LC number not found on the LC")
+
+    compact_number = re.sub(r"[^A-Z0-9]", "", str(lc_number).upper())
+    compact_text = re.sub(r"[^A-Z0-9]", "", invoice_text.upper())
+    if compact_number and compact_number in compact_text:
+        return result("lc_number", MATCH, lc_number, lc_number, "LC number referenced on the invoice")
+    return result("lc_number", DISCREPANCY, lc_number, None, "LC number not referenced on the invoice")
+
+
+def compare_dates(lc_fields, invoice_fields) -> list:
+    """
+    Checks the invoice date against the LC expiry and the shipment date against the latest
+    shipment date.
+    """
+    results = []
+    _, expiry_raw = find_field(lc_fields, LC_FIELDS["expiry_date"])
+    _, invoice_date_raw = find_field(invoice_fields, INVOICE_FIELDS["invoice_date"])
+    expiry, invoice_date = parse_date(expiry_raw), parse_date(invoice_date_raw)
+    if expiry and invoice_date:
+        status = MATCH if invoice_date <= expiry else DISCREPANCY
+        results.append(result("expiry_date", status, expiry, invoice_date,
+                              "Invoice dated on or before expiry" if status == MATCH else "Invoice dated after expiry"))
+    else:
+        results.append(result("expiry_date", MISSING, expiry or expiry_raw, invoice_date or invoice_date_raw,
+                              "Expiry or invoice date not found"))
+
+    _, latest_raw = find_field(lc_fields, LC_FIELDS["latest_shipment_date"])
+    _, shipment_raw = find_field(invoice_fields, INVOICE_FIELDS["shipment_date"])
+    latest, shipment = parse_date(latest_raw), parse_date(shipment_raw)
+    if latest and shipment:
+        status = MATCH if shipment <= latest else DISCREPANCY
+        results.append(result("latest_shipment_date", status, latest, shipment,
+                              "Shipped on or before the latest shipment date" if status == MATCH
+                              else "Shipped after the latest shipment date"))
+    elif latest:
+        results.append(result("latest_shipment_date", MISSING, latest, shipment_raw,
+                              "Shipment date not found on the invoice"))
+    return results
+
+
+def compare_incoterms(lc_text, invoice_text) -> dict:
+    lc_terms = sorted(set(INCOTERMS_PATTERN.findall(lc_text)))
+    invoice_terms = sorted(set(INCOTERMS_PATTERN.findall(invoice_text)))
+    if not lc_terms:
+        return result("incoterms", MISSING, None, ", ".join(invoice_terms) or None, "No incoterm on the LC")
+    if not invoice_terms:
+        return result("incoterms", MISSING, ", ".join(lc_terms), None, "No incoterm on the invoice")
+    status = MATCH if set(lc_terms) & set(invoice_terms) else DISCREPANCY
+    return result("incoterms", status, ", ".join(lc_terms), ", ".join(invoice_terms))
+
+
+def compare_fields(lc_data, invoice_data) -> list:
+    """
+    Rule based comparison of an LC and an invoice over their extracted fields: amount with
+    tolerance, currency, beneficiary and applicant names, LC number reference, invoice and
+    shipment dates against expiry and latest shipment, and incoterms.
+
+    Parameters:
+    - lc_data (dict): The Azure result of the Letter of Credit.
+    - invoice_data (dict): The Azure result of the Invoice.
+
+    Returns:
+    - list: One dict per field with its status (match, discrepancy, ambiguous or missing),
+      both values and a short detail.
+    """
+    lc_fields, invoice_fields = flatten_fields(lc_data), flatten_fields(invoice_data)
+    lc_text, invoice_text = document_text(lc_data, lc_fields), document_text(invoice_data, invoice_fields)
+
+    results = compare_amount(lc_fields, invoice_fields)
+    results.append(compare_party("beneficiary", lc_fields, LC_FIELDS["beneficiary"], invoice_fields, INVOICE_FIELDS["seller"]))
+    results.append(compare_party("applicant", lc_fields, LC_FIELDS["applicant"], invoice_fields, INVOICE_FIELDS["buyer"]))
+    results.append(compare_lc_number(lc_fields, invoice_fields, invoice_text))
+    results.extend(compare_dates(lc_fields, invoice_fields))
+    results.append(compare_incoterms(lc_text, invoice_text))
+    return results
+
+
+def summarize(results) -> dict:
+    """
+    Counts the field results per status.
+    """
+    summary = {MATCH: 0, DISCREPANCY: 0, AMBIGUOUS: 0, MISSING: 0}
+    for field_result in results:
+        summary[field_result["status"]] += 1
+    return summary
+
+
+def render_report(results) -> str:
+    """
+    Renders the field results as a markdown table with a one line verdict.
+    """
+    summary = summarize(results)
+    if summary[DISCREPANCY]:
+        verdict = f"{summary[DISCREPANCY]} discrepancy(ies) found, the invoice does not comply with the LC as presented."
+    elif summary[AMBIGUOUS] or summary[MISSING]:
+        verdict = "No discrepancy found by the field checks, the fields marked for review need a manual check."
+    else:
+        verdict = "All checked fields match, the invoice looks consistent with the LC."
+
+    def cell(value):
+        return "-" if value is None else " ".join(str(value).split())
+
+    rows = [f"| {item['field']} | {item['status']} | {cell(item['lc_value'])} | {cell(item['invoice_value'])} | {item['detail']} |"
+            for item in results]
+    return "\n".join([f"**{verdict}**", "", "| Field | Status | LC | Invoice | Detail |",
+                      "| :--- | :--- | :--- | :--- | :--- |", *rows])
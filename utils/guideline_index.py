@@ -0,0 +1,146 @@
+from .prompt_compaction import count_tokens
+import numpy as np
+import logging
+import os
+import re
+from dotenv import load_dotenv
+load_dotenv()
+
+# Clauses attached to a query, and the tokens they may take in the prompt
+TOP_K = int(os.getenv("GUIDELINES_TOP_K", "5"))
+TOKEN_BUDGET = int(os.getenv("GUIDELINES_TOKEN_BUDGET", "800"))
+# Longer clauses are split on sentences so one clause cannot take the whole budget
+CLAUSE_MAX_TOKENS = int(os.getenv("GUIDELINES_CLAUSE_MAX_TOKENS", "200"))
+
+# A line that starts a clause: "1.", "2.3", "a)", "(iv)", "Article 5", "Section 2", "Rule 7", "- " ...
+CLAUSE_START = re.compile(r"^\s*(\d+(\.\d+)*[.)]?\s|[A-Za-z][.)]\s|\(([a-z]|[ivx]+)\)\s|[-*•]\s|"
+                          r"(article|section|clause|rule|guideline)\s+\w+)", re.IGNORECASE)
+PINNED = re.compile(r"always[\s-]+appl(y|ies|ied)", re.IGNORECASE)
+
+
+def split_sentences(text, max_tokens) -> list:
+    """
+    Groups the sentences of a long clause into parts of at most `max_tokens` tokens.
+    """
+    parts = []
+    current = []
+    for sentence in re.split(r"(?<=[.;:!?])\s+", text):
+        if current and count_tokens(" ".join(current + [sentence])) > max_tokens:
+            parts.append(" ".join(current))
+            current = []
+        current.append(sentence)
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+def split_clauses(text, max_tokens=None) -> list:
+    """
+    Splits a guidelines document into clauses.
+
+    A clause starts at a numbered, lettered or bulleted line or an "Article/Section/Rule" heading,
+    and runs until the next one; a document without such markers is split on blank lines.
+
+    Parameters:
+    - text (str): The guidelines text, one element per line.
+    - max_tokens (int): Longest clause in tokens, GUIDELINES_CLAUSE_MAX_TOKENS by default.
+
+    Returns:
+    - list: The clause texts, in document order.
+    """
+    max_tokens = max_tokens or CLAUSE_MAX_TOKENS
+    lines = [line.strip() for line in text.splitlines()]
+
+    clauses = []
+    current = []
+    if any(CLAUSE_START.match(line) for line in lines):
+        for line in lines:
+            if CLAUSE_START.match(line) and current:
+                clauses.append(" ".join(current))
+                current = []
+            if line:
+                current.append(line)
+    else:
+        for line in lines:
+            if not line and current:
+                clauses.append(" ".join(current))
+                current = []
+            elif line:
+                current.append(line)
+    if current:
+        clauses.append(" ".join(current))
+
+    split = []
+    for clause in clauses:
+        if count_tokens(clause) > max_tokens:
+            split.extend(split_sentences(clause, max_tokens))
+        else:
+            split.append(clause)
+    return split
+
+
+class GuidelineIndex:
+    """
+    Small vector index over the clauses of the uploaded guidelines.
+
+    The clauses are embedded once when the guidelines are uploaded. Each query then gets the
+    clauses closest to its question (and answer, for the rewrite) within a token budget,
+    instead of the whole document. Clauses that say they "always apply" are pinned to every query.
+    Guidelines that already fit in the budget are sent whole without embedding anything.
+    """
+
+    def __init__(self, text, embedding_model):
+        self.embedding_model = embedding_model
+        self.text = text
+        self.clauses = split_clauses(text)
+        self.tokens = [count_tokens(clause) for clause in self.clauses]
+        self.pinned = [bool(PINNED.search(clause)) for clause in self.clauses]
+        self.vectors = None
+
+        if sum(self.tokens) > TOKEN_BUDGET:
+            # The backends return normalized embeddings, so a dot product is the cosine similarity
+            self.vectors = np.asarray(embedding_model.embed_documents(self.clauses), dtype=np.float32)
+
+        logging.info(f"Indexed {len(self.clauses)} Guideline Clauses ({sum(self.tokens)} tokens, "
+                     f"{sum(self.pinned)} pinned)")
+
+    def select(self, question, answer=None, top_k=None, budget=None) -> str:
+        """
+        Returns the guideline clauses relevant to a query.
+
+        Pinned clauses come first, then the highest scoring clauses while they fit in the
+        budget, up to `top_k`. The selected clauses are written in document order.
+
+        Parameters:
+        - question (str): The user question.
+        - answer (str): The answer being revised, if any; it is part of the search text.
+        - top_k (int): Most clauses selected by similarity, GUIDELINES_TOP_K by default.
+        - budget (int): Token budget of the selected clauses, GUIDELINES_TOKEN_BUDGET by default.
+
+        Returns:
+        - str: The selected clauses, one per line.
+        """
+        top_k = top_k or TOP_K
+        budget = budget or TOKEN_BUDGET
+        if self.vectors is None or sum(self.tokens) <= budget:
+            return self.text
+
+        selected = [index for index, pinned in enumerate(self.pinned) if pinned]
+        used = sum(self.tokens[index] for index in selected)
+        if used > budget:
+            logging.warning(f"Pinned guideline clauses take {used} tokens, over the budget of {budget}")
+
+        query = question if not answer else f"{question}\n{answer}"
+        scores = self.vectors @ np.asarray(self.embedding_model.embed_query(query), dtype=np.float32)
+        ranked = 0
+        for index in np.argsort(-scores):
+            if ranked >= top_k:
+                break
+            if self.pinned[index] or used + self.tokens[index] > budget:
+                continue
+            selected.append(int(index))
+            used += self.tokens[index]
+            ranked += 1
+
+        logging.info(f"Selected {len(selected)} of {len(self.clauses)} Guideline Clauses ({used} tokens)")
+        return "\n".join(self.clauses[index] for index in sorted(selected))
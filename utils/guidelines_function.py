@@ -1,10 +1,64 @@
 from unstructured.partition.pdf import partition_pdf
 from fastapi import HTTPException
 import logging, traceback
+import collections, os, random, threading, time
 from .user import GUIDELINES
 from .azure_model import azure_openai
 from langchain.chains import LLMChain
 from .prompts import GUILDELINES_PROMPT
+from dotenv import load_dotenv
+load_dotenv()
+
+# "single_pass" puts the guidelines in the answer prompt, "two_pass" rewrites the answer in a second call
+GUIDELINES_MODE = os.getenv("GUIDELINES_MODE", "single_pass")
+GUIDELINES_MAX_RETRIES = int(os.getenv("GUIDELINES_MAX_RETRIES", "2"))
+GUIDELINES_BACKOFF_BASE = float(os.getenv("GUIDELINES_BACKOFF_BASE", "0.5"))
+GUIDELINES_BACKOFF_MAX = float(os.getenv("GUIDELINES_BACKOFF_MAX", "4"))
+
+
+class RetryBudget:
+    """
+    Caps retries to a share of the recent requests, so a failing LLM deployment is not hit by
+    a burst of retries from every query at once.
+
+    Within the sliding `window` seconds, retries are allowed while they stay below
+    `ratio` times the requests, or below `min_retries`.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=3, window=60.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self.requests = collections.deque()
+        self.retries = collections.deque()
+        self.lock = threading.Lock()
+
+    def prune(self, now):
+        for events in (self.requests, self.retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self.lock:
+            now = time.monotonic()
+            self.prune(now)
+            self.requests.append(now)
+
+    def try_retry(self) -> bool:
+        """
+        Spends one retry from the budget, returns False when it is exhausted.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.prune(now)
+            if len(self.retries) >= max(self.min_retries, self.ratio * len(self.requests)):
+                return False
+            self.retries.append(now)
+            return True
+
+
+retry_budget = RetryBudget(ratio=float(os.getenv("GUIDELINES_RETRY_BUDGET", "0.2")))
+guideline_chain = LLMChain(llm=azure_openai,prompt=GUILDELINES_PROMPT,output_key="refactored_response")
 
 
 def extract_guidlines(file,file_type) -> str:
@@ -26,7 +80,8 @@ def extract_guidlines(file,file_type) -> str:
         for document in documents:
             extracted_text.append(document.text)
 
-        return " ".join(extracted_text) 
+        # One element per line, so the clause index can find the clause boundaries
+        return "\n".join(extracted_text)
     else:
         error_msg = "File Type is not valid "
         logging.error(f"Error: {error_msg} trace_back:{traceback.format_exc()}")
@@ -34,13 +89,31 @@ def extract_guidlines(file,file_type) -> str:
     
 
 
+def select_guidelines(query,gpt_response=None) -> str:
+    """
+    Returns the guideline clauses relevant to a query, or the whole guidelines when they were
+    not indexed.
+
+    Parameters:
+    - query (str): The original query made by the user.
+    - gpt_response (str): The answer being revised, if any.
+
+    Returns:
+    - str: The guidelines to put in the prompt, None when no guidelines are set.
+    """
+    index = GUIDELINES.get("index")
+    if index is None:
+        return GUIDELINES.get("guidelines")
+    return index.select(query,gpt_response)
+
 
 def guidelines_chain(query,gpt_response) -> str:
     """
     Processes a query and a GPT response through a set of guidelines to refine the response.
 
     This function takes a user query and a response generated by GPT,and processes it through a series of guidelines. 
-    The function attempts to refine the GPT response based on these guidelines.
+    The function attempts to refine the GPT response based on these guidelines. Failed calls are retried
+    up to GUIDELINES_MAX_RETRIES times with jittered exponential backoff, while the shared retry budget allows it.
 
     Parameters:
     - query (str): The original query made by the user.
@@ -53,29 +126,28 @@ def guidelines_chain(query,gpt_response) -> str:
     
     try:
         guidelines = GUIDELINES.get("guidelines")
-        if guidelines is not None:
-
-            max_retries = 7
-            retries = 0
-
-            while retries<max_retries:
-
-                try:
-                    guideline_chian = LLMChain(llm=azure_openai,prompt=GUILDELINES_PROMPT,output_key="refactored_response")
-                    input_variables = {"user_query":query,"llm_response":gpt_response,"admin_instructions":guidelines}
-                    response = guideline_chian.run(input_variables)
-                    if response is not None:
-                        return response
-                except:
-                    response = None
-                
-                retries += 1
-
+        if guidelines is None:
+            return gpt_response
+
+        retry_budget.record_request()
+        input_variables = {"user_query":query,"llm_response":gpt_response,
+                           "admin_instructions":select_guidelines(query,gpt_response)}
+
+        for attempt in range(GUIDELINES_MAX_RETRIES + 1):
+            try:
+                response = guideline_chain.run(input_variables)
+                if response is not None:
+                    return response
+            except Exception as e:
+                logging.warning(f"Guidelines rewrite attempt {attempt + 1} failed: {e}")
+
+            if attempt == GUIDELINES_MAX_RETRIES or not retry_budget.try_retry():
+                break
+            time.sleep(random.uniform(0, min(GUIDELINES_BACKOFF_MAX, GUIDELINES_BACKOFF_BASE * (2 ** attempt))))
+
+        logging.warning("Guidelines rewrite failed, returning the original response")
         return gpt_response
     except Exception as e:
         error_msg =" Error while Generating Guidlines Chain:"
         logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
         raise Exception (f"{error_msg} {e}")
-
-    
-    
\ No newline at end of file
@@ -1,11 +1,16 @@
 from langchain.chains import LLMChain
+from langchain_community.callbacks import get_openai_callback
 import logging
+import threading
+import time
 import traceback
 from .azure_model import azure_openai
-from .guidelines_function import guidelines_chain
-from .doc_reteriver import ensemble_retriever
-from .prompts import QUERY_PROMPT
-from .user import TABULAR_DATA
+from .guidelines_function import guidelines_chain, select_guidelines, GUIDELINES_MODE
+from .doc_reteriver import retrieve_context
+from .context_assembly import assemble_context, render_context, pack_tables
+from .executors import run_blocking
+from .prompts import QUERY_PROMPT, QUERY_GUIDELINES_PROMPT, GUILDELINES_PROMPT
+from .user import TABULAR_DATA, GUIDELINES
 
 try:
     llm = azure_openai
@@ -14,6 +19,40 @@ except Exception as e:
     logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
     raise Exception (f"{error_msg} {e}")
 
+query_stats = {}
+query_stats_lock = threading.Lock()
+
+def guidelines_mode() -> str:
+    """
+    Returns how the current query applies the admin guidelines: "none", "single_pass" or "two_pass".
+    """
+    if GUIDELINES.get("guidelines") is None:
+        return "none"
+    return "two_pass" if GUIDELINES_MODE == "two_pass" else "single_pass"
+
+def record_query(mode,seconds,callback=None):
+    """
+    Adds the latency and, when measured, the token usage of a query to the per-mode stats.
+    """
+    with query_stats_lock:
+        stats = query_stats.setdefault(mode, {"queries": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+        stats["queries"] += 1
+        stats["seconds"] += seconds
+        if callback is not None:
+            stats["prompt_tokens"] += callback.prompt_tokens
+            stats["completion_tokens"] += callback.completion_tokens
+
+def get_query_stats() -> dict:
+    """
+    Returns the average latency and token usage per query for each guidelines mode.
+    """
+    with query_stats_lock:
+        return {mode: {"queries": stats["queries"],
+                       "avg_seconds": stats["seconds"] / stats["queries"],
+                       "avg_prompt_tokens": stats["prompt_tokens"] / stats["queries"],
+                       "avg_completion_tokens": stats["completion_tokens"] / stats["queries"]}
+                for mode, stats in query_stats.items()}
+
 def get_files(context) -> dict:
     """
     Get the Context retrieved by the retrievers and extract the file names which has 
@@ -50,55 +89,24 @@ def get_tables(files,uuid) ->  list:
         -list: A list of reference tables found in the specified files and pages.
 
     """
-    tabular_data = TABULAR_DATA.get(uuid)
+    table_index = TABULAR_DATA.get(uuid, {})
     referance_table = []
-    
-    keys = list(files.keys())
-    keys_item = -1
-    tables = False
-    table_found = True
-    pages = {}
-    try :
-
-        while True:
-        
-            if not pages and not tables:
 
-                keys_item +=1
-                if keys_item<len(keys):
-                    file_name = keys[keys_item]
-                    pages = files[keys[keys_item]]
-                else:
-                    break 
-            
-            
-            #  for founding tables of one file pages  
-            if table_found:
-                item = 0
-                page_number = pages.pop()
-                table_found = False
-
-            if not pages:
-                tables = True
-
-            if (tabular_data[item].get("file_name")==file_name and tabular_data[item].get("page_number")==page_number):
-                table_found = True
-                referance_table.append(tabular_data[item])
-                tables = False 
-            
-            item += 1
-
-            if item == len(tabular_data):
-                table_found = True
+    try :
+        for file_name, pages in files.items():
+            for page_number in sorted(pages):
+                table = table_index.get((file_name, page_number))
+                if table is not None:
+                    referance_table.append(table)
 
         return referance_table
-    
+
     except Exception as e:
         error_msg =" Error while Retrieving Tables: "
         logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
         raise Exception (f"{error_msg} {e}")
 
-def gpt_chain(vector_store,question,documents,uuid) -> dict:
+def gpt_chain(vector_store,question,bm25_index,uuid) -> dict:
     
     """
     Executes a query-answering process using a LLM, supported by an ensemble of retrievers for context retrieval.
@@ -108,7 +116,7 @@ def gpt_chain(vector_store,question,documents,uuid) -> dict:
     Parameters:
     - vector_store (VectorStore): A vectorized data store used for context retrieval based on similarity scores.
     - question (str): The question to be answered by the LLM.
-    - documents (list): A list of documents that serve as a knowledge base for context retrieval.
+    - bm25_index (BM25Index): The session's keyword index that serves as a knowledge base for context retrieval.
     - uuid (str): A unique identifier used for filtering data in retrievers.
 
     Returns:
@@ -117,14 +125,25 @@ def gpt_chain(vector_store,question,documents,uuid) -> dict:
 
     try:        
         logging.info("Generating Q/A Chain")
-        context = ensemble_retriever(vector_store,documents,uuid,question)
+        mode = guidelines_mode()
+        start = time.perf_counter()
+        context = assemble_context(retrieve_context(vector_store,bm25_index,uuid,question,with_scores=True))
         files = get_files(context)
-        referance_table = get_tables(files,uuid)
+        referance_table = pack_tables(get_tables(files,uuid),question)
         if context:
-            qa_chain = LLMChain(llm=llm,prompt=QUERY_PROMPT)
-            gpt_response = qa_chain({"question":question,"context":context,"referance_table":referance_table})
-            result = guidelines_chain(question,gpt_response["text"])
-            logging.info("Q/A Chain Processed Successfully")
+            with get_openai_callback() as callback:
+                if mode == "single_pass":
+                    qa_chain = LLMChain(llm=llm,prompt=QUERY_GUIDELINES_PROMPT)
+                    result = qa_chain({"question":question,"context":render_context(context),"referance_table":"\n\n".join(referance_table),
+                                       "admin_instructions":select_guidelines(question)})["text"]
+                else:
+                    qa_chain = LLMChain(llm=llm,prompt=QUERY_PROMPT)
+                    gpt_response = qa_chain({"question":question,"context":render_context(context),"referance_table":"\n\n".join(referance_table)})
+                    result = guidelines_chain(question,gpt_response["text"])
+
+            seconds = time.perf_counter() - start
+            record_query(mode,seconds,callback)
+            logging.info(f"Q/A Chain Processed Successfully in {seconds:.2f}s with {callback.total_tokens} tokens (guidelines {mode})")
 
             return result
         
@@ -134,3 +153,72 @@ def gpt_chain(vector_store,question,documents,uuid) -> dict:
         error_msg =" Error while Generating Chain:"
         logging.error(f"{error_msg}{e} trace_back:{traceback.format_exc()}")
         raise Exception (f"{error_msg} {e}")
+
+
+def get_sources(context) -> dict:
+    """
+    Returns the files and pages of the retrieved context, for the streaming metadata event.
+    """
+    sources = {}
+    for docs in context:
+        sources.setdefault(docs.metadata.get("file_name"), set()).add(docs.metadata.get("page_number"))
+    return {file_name: sorted(pages) for file_name, pages in sources.items()}
+
+async def astream_gpt_chain(vector_store,question,bm25_index,uuid):
+    """
+    Streaming variant of `gpt_chain`: yields (event, data) pairs as soon as they are available.
+
+    Events:
+    - metadata: the retrieved files and pages and the number of reference tables, sent before the LLM call.
+    - token: a piece of the answer.
+    - revision: the guidelines rewrite starts, the tokens that follow replace the answer so far.
+
+    Parameters:
+    - vector_store (VectorStore): A vectorized data store used for context retrieval based on similarity scores.
+    - question (str): The question to be answered by the LLM.
+    - bm25_index (BM25Index): The session's keyword index that serves as a knowledge base for context retrieval.
+    - uuid (str): A unique identifier used for filtering data in retrievers.
+    """
+    logging.info("Streaming Q/A Chain")
+    context = assemble_context(await run_blocking("llm", retrieve_context, vector_store, bm25_index, uuid, question, True))
+    files = get_files(context)
+    referance_table = pack_tables(get_tables(files,uuid),question)
+    yield "metadata", {"sources": get_sources(context), "tables": len(referance_table)}
+
+    if not context:
+        yield "token", "No Data Found"
+        return
+
+    mode = guidelines_mode()
+    start = time.perf_counter()
+    if mode == "single_pass":
+        guidelines = await run_blocking("llm", select_guidelines, question)
+        prompt = QUERY_GUIDELINES_PROMPT.format(question=question, context=render_context(context), referance_table="\n\n".join(referance_table),
+                                                admin_instructions=guidelines)
+    else:
+        prompt = QUERY_PROMPT.format(question=question, context=render_context(context), referance_table="\n\n".join(referance_table))
+
+    answer = []
+    async for chunk in llm.astream(prompt):
+        if chunk.content:
+            answer.append(chunk.content)
+            yield "token", chunk.content
+
+    if mode == "two_pass":
+        yield "revision", {}
+        revised = False
+        try:
+            guidelines = await run_blocking("llm", select_guidelines, question, "".join(answer))
+            prompt = GUILDELINES_PROMPT.format(user_query=question, llm_response="".join(answer), admin_instructions=guidelines)
+            async for chunk in llm.astream(prompt):
+                if chunk.content:
+                    revised = True
+                    yield "token", chunk.content
+        except Exception as e:
+            logging.error(f" Error while Streaming Guidlines Chain:{e} trace_back:{traceback.format_exc()}")
+        if not revised:
+            # Like guidelines_chain, fall back to the original answer
+            yield "token", "".join(answer)
+
+    # Streamed completions carry no token usage, only the latency is recorded
+    record_query(f"{mode}_stream", time.perf_counter() - start)
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import traceback
+from dotenv import load_dotenv
+load_dotenv()
+
+
+class ParseCache:
+    """
+    Content addressed on-disk cache for parse results.
+
+    Entries are keyed by the SHA-256 of the PDF bytes plus a parser/strategy version, so the
+    same document uploaded again (by any user or session) skips both the Azure Document
+    Intelligence call and the local parse. The directory is kept under `max_bytes` by evicting
+    the least recently used entries.
+
+    Attributes:
+    - stats: Hit, miss, write and eviction counters.
+    """
+
+    def __init__(self, cache_dir, max_bytes, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def path(self, sha256, version) -> str:
+        name = hashlib.sha256(f"{version}\x00{sha256}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.pkl")
+
+    def count(self, counter):
+        with self.lock:
+            self.stats[counter] += 1
+
+    def get(self, sha256, version):
+        """
+        Returns the cached parse result or None.
+
+        Parameters:
+        - sha256 (str): Hex digest of the PDF bytes.
+        - version (str): Parser and strategy version of the result.
+        """
+        if not self.enabled:
+            return None
+
+        path = self.path(sha256, version)
+        try:
+            with open(path, "rb") as cache_file:
+                value = pickle.load(cache_file)
+            os.utime(path)
+            self.count("hits")
+            return value
+        except FileNotFoundError:
+            self.count("misses")
+            return None
+        except Exception as e:
+            logging.error(f"Error while Reading Parse Cache: {e} trace_back:{traceback.format_exc()}")
+            self.count("misses")
+            return None
+
+    def put(self, sha256, version, value):
+        """
+        Stores a parse result and evicts old entries when the cache grows over `max_bytes`.
+        """
+        if not self.enabled or value is None:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self.path(sha256, version)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as cache_file:
+                pickle.dump(value, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+            self.count("writes")
+            self.evict()
+        except Exception as e:
+            logging.error(f"Error while Writing Parse Cache: {e} trace_back:{traceback.format_exc()}")
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pkl"):
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                    entries.append((stat.st_mtime, stat.st_size, name))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+                self.stats["evictions"] += 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+
+parse_cache = ParseCache(
+    cache_dir=os.getenv("PARSE_CACHE_DIR", ".parse_cache"),
+    max_bytes=int(float(os.getenv("PARSE_CACHE_MAX_MB", "2048")) * 1024 * 1024),
+    enabled=os.getenv("PARSE_CACHE", "true").lower() == "true"
+)
@@ -0,0 +1,106 @@
+from pypdf import PdfReader, PdfWriter
+import logging
+import os
+import re
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+MIN_TEXT_CHARS = int(os.getenv("PDF_MIN_TEXT_CHARS", "50"))
+TABLE_LINE_RATIO = float(os.getenv("PDF_TABLE_LINE_RATIO", "0.2"))
+MIN_TABLE_LINES = int(os.getenv("PDF_MIN_TABLE_LINES", "3"))
+
+
+def has_images(page) -> bool:
+    """
+    Checks the page resources for image XObjects without decoding them.
+    """
+    try:
+        resources = page.get("/Resources") or {}
+        xobjects = resources.get("/XObject") or {}
+        return any(xobject.get_object().get("/Subtype") == "/Image" for xobject in xobjects.values())
+    except Exception:
+        return False
+
+
+def table_lines(layout_text) -> int:
+    """
+    Counts lines that look like table rows: at least three cells separated by wide gaps.
+    """
+    return sum(1 for line in layout_text.splitlines() if len(re.split(r"\s{2,}", line.strip())) >= 3)
+
+
+def analyze_page(page, page_number) -> dict:
+    """
+    Measures the text layer of a page and picks its parsing strategy.
+
+    Strategies:
+    - fast: the text layer is used as is.
+    - hi_res: layout model with table structure, for pages that look like they contain tables.
+    - ocr_only: OCR, for scanned pages without a usable text layer.
+
+    Parameters:
+    - page (PageObject): The pypdf page.
+    - page_number (int): One based page number.
+
+    Returns:
+    - dict: Page number, strategy, text, text length and table line statistics.
+    """
+    text = page.extract_text() or ""
+    chars = len(text.strip())
+
+    if chars < MIN_TEXT_CHARS:
+        strategy = "ocr_only" if has_images(page) else "fast"
+        return {"page_number": page_number, "strategy": strategy, "text": text, "chars": chars, "table_lines": 0}
+
+    layout_text = page.extract_text(extraction_mode="layout") or ""
+    lines = [line for line in layout_text.splitlines() if line.strip()]
+    rows = table_lines(layout_text)
+    is_table = rows >= MIN_TABLE_LINES and rows / max(len(lines), 1) >= TABLE_LINE_RATIO
+
+    return {"page_number": page_number, "strategy": "hi_res" if is_table else "fast",
+            "text": text, "chars": chars, "table_lines": rows}
+
+
+def plan_pages(file) -> list:
+    """
+    Selects a parsing strategy for every page of a PDF.
+
+    Parameters:
+    - file (str): Path of the PDF.
+
+    Returns:
+    - list: One analysis dict per page (see `analyze_page`), with the time spent analysing it.
+    """
+    reader = PdfReader(file)
+    plan = []
+    for page_number, page in enumerate(reader.pages, start=1):
+        start = time.perf_counter()
+        analysis = analyze_page(page, page_number)
+        analysis["analysis_seconds"] = time.perf_counter() - start
+        plan.append(analysis)
+    return plan
+
+
+def write_subset(file, page_numbers, output_path):
+    """
+    Writes the given pages of a PDF to a new file, keeping their order.
+    """
+    reader = PdfReader(file)
+    writer = PdfWriter()
+    for page_number in page_numbers:
+        writer.add_page(reader.pages[page_number - 1])
+    with open(output_path, "wb") as output_file:
+        writer.write(output_file)
+
+
+def log_plan(file_name, plan, strategy_seconds):
+    """
+    Logs which strategy each page got and the time spent per strategy.
+    """
+    pages = {strategy: [page["page_number"] for page in plan if page["strategy"] == strategy]
+             for strategy in ("fast", "hi_res", "ocr_only")}
+    logging.info(f"Parsing strategy for {file_name}: "
+                 + ", ".join(f"{strategy} pages {numbers} in {strategy_seconds.get(strategy, 0.0):.2f}s"
+                             for strategy, numbers in pages.items() if numbers)
+                 + f", analysis {sum(page.get('analysis_seconds', 0.0) for page in plan):.2f}s")
@@ -0,0 +1,164 @@
+from .field_matcher import field_value, normalize_label
+from functools import lru_cache
+import json
+import os
+import tiktoken
+from dotenv import load_dotenv
+load_dotenv()
+
+# Tokens allowed for the LC and invoice data of one comparison prompt, and how they are written:
+# "kv" as one "path: value" line per field, "json" as a flat compact JSON object
+TOKEN_BUDGET = int(os.getenv("COMPARISON_TOKEN_BUDGET", "6000"))
+PROMPT_FORMAT = os.getenv("COMPARISON_PROMPT_FORMAT", "kv")
+
+# Layout, geometry and service metadata that carry no comparable information
+DROPPED_KEYS = {"spans", "confidence", "mean_confidence", "min_confidence", "boundingRegions", "bounding_regions",
+                "polygon", "pages", "paragraphs", "tables", "styles", "lines", "words", "sections", "figures",
+                "selectionMarks", "apiVersion", "modelId", "stringIndexType", "contentFormat", "type", "valueType"}
+
+# Wrappers left out of the field paths
+TRANSPARENT_KEYS = {"fields", "documents", "analyzeResult", "analyze_result", "result"}
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    try:
+        return tiktoken.encoding_for_model(os.getenv("model_name") or "gpt-4")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def is_field(node) -> bool:
+    """
+    An Azure field object: a `type`/`valueType`, or a typed `value*` key next to its `content`.
+    """
+    return isinstance(node, dict) and ("type" in node or "valueType" in node or (
+        "content" in node and any(key.replace("_", "").lower().startswith("value") for key in node)))
+
+
+def join_path(path, key) -> str:
+    return f"{path}.{key}" if path else str(key)
+
+
+def field_items(data) -> list:
+    """
+    Flattens a parser response to (path, value) items. Azure fields are reduced to their typed
+    value, so `content` is only kept when the field has no `value*`, empty entries are dropped
+    and whitespace is collapsed. Extracted fields come first and the full document text last,
+    so it is the first thing cut when the token budget is tight.
+
+    Parameters:
+    - data (dict): The parser response.
+
+    Returns:
+    - list: (dotted path, scalar value) pairs.
+    """
+    items = []
+    document_content = []
+
+    def visit(node, path):
+        if is_field(node):
+            node = field_value(node)
+
+        if isinstance(node, dict):
+            for pair in node.get("keyValuePairs") or []:
+                key = (pair.get("key") or {}).get("content")
+                value = (pair.get("value") or {}).get("content")
+                if key and value:
+                    visit(value, join_path(path, normalize_label(key)))
+
+            for key, value in node.items():
+                if key in DROPPED_KEYS or key == "keyValuePairs":
+                    continue
+                if key == "content" and not path:
+                    document_content.append(value)
+                elif key in TRANSPARENT_KEYS:
+                    visit(value, path)
+                else:
+                    visit(value, join_path(path, key))
+
+        elif isinstance(node, list):
+            if len(node) == 1:
+                visit(node[0], path)
+            else:
+                for index, item in enumerate(node):
+                    visit(item, join_path(path, index))
+
+        elif isinstance(node, str):
+            text = " ".join(node.split())
+            if text:
+                items.append((path, text))
+
+        elif node is not None:
+            items.append((path, node))
+
+    visit(data, "")
+    items.extend(("content", " ".join(str(text).split())) for text in document_content if text)
+    return items
+
+
+def render_items(items, prompt_format=None) -> str:
+    """
+    Writes items as "path: value" lines, or as a flat JSON object without whitespace.
+    """
+    if (prompt_format or PROMPT_FORMAT) == "json":
+        return json.dumps(dict(items), separators=(",", ":"), ensure_ascii=False, default=str)
+    return "\n".join(f"{path}: {value}" for path, value in items)
+
+
+def fit_items(items, budget, prompt_format=None) -> list:
+    """
+    Keeps items in order while they fit in `budget` tokens. An item that does not fit is
+    skipped so smaller ones after it can still be kept; only the document text (`content`,
+    which comes last) is cut to the remaining tokens instead.
+    """
+    encoding = get_encoding()
+    kept = []
+    used = 2
+    for path, value in items:
+        cost = count_tokens(render_items([(path, value)], prompt_format)) + 1
+        if used + cost <= budget:
+            kept.append((path, value))
+            used += cost
+            continue
+
+        remaining = budget - used - count_tokens(f"{path}: ") - 2
+        if path == "content" and isinstance(value, str) and remaining > 10:
+            value = encoding.decode(encoding.encode(value, disallowed_special=())[:remaining]) + "..."
+            kept.append((path, value))
+            used += count_tokens(render_items([(path, value)], prompt_format)) + 1
+    return kept
+
+
+def compact_pair(lc_data, invoice_data, budget=None, prompt_format=None):
+    """
+    Compacts the LC and invoice data of a comparison prompt into `budget` tokens.
+
+    The budget is shared: each document gets half, and what one of them does not need goes to
+    the other.
+
+    Parameters:
+    - lc_data (dict): The Azure result of the Letter of Credit.
+    - invoice_data (dict): The Azure result of the Invoice.
+    - budget (int): Token budget for both documents, COMPARISON_TOKEN_BUDGET by default.
+    - prompt_format (str): "kv" or "json", COMPARISON_PROMPT_FORMAT by default.
+
+    Returns:
+    - tuple: The compacted LC text and invoice text.
+    """
+    budget = budget or TOKEN_BUDGET
+    lc_items, invoice_items = field_items(lc_data), field_items(invoice_data)
+    lc_tokens = count_tokens(render_items(lc_items, prompt_format))
+    invoice_tokens = count_tokens(render_items(invoice_items, prompt_format))
+
+    lc_budget = max(budget // 2, budget - invoice_tokens)
+    invoice_budget = max(budget // 2, budget - lc_tokens)
+    if lc_tokens > lc_budget:
+        lc_items = fit_items(lc_items, lc_budget, prompt_format)
+    if invoice_tokens > invoice_budget:
+        invoice_items = fit_items(invoice_items, invoice_budget, prompt_format)
+    return render_items(lc_items, prompt_format), render_items(invoice_items, prompt_format)
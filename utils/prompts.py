@@ -4,7 +4,7 @@ QUERY_PROMPT_TEMPLATE = """
         As a proficient PDF reader and data analyst, your main objectives are:
         1. Provide accurate and detailed responses.
         2. Ensure efficiency in information retrieval and analysis.
-        3. if you are not sure of any informatioQUERY_PROMPTn verify it in table_html list (if given) in referance_table along with its file name and page number 
+        3. if you are not sure of any informatioQUERY_PROMPTn verify it in the tables (if given) in referance_table, listed with their file name and page number 
         than provide an answer.
         4. if the information is not mentioned in referance_table then Focus on the context only and generate answer from the context.         
         
@@ -30,6 +30,16 @@ QUERY_PROMPT_TEMPLATE = """
 
 QUERY_PROMPT = PromptTemplate.from_template(template=QUERY_PROMPT_TEMPLATE)
 
+# Single pass guidelines: the admin instructions are part of the answer prompt itself
+QUERY_GUIDELINES_PROMPT_TEMPLATE = QUERY_PROMPT_TEMPLATE.replace("""
+        Question:""", """
+        Admin Instructions (the answer must comply with them):
+        {admin_instructions}
+
+        Question:""")
+
+QUERY_GUIDELINES_PROMPT = PromptTemplate.from_template(template=QUERY_GUIDELINES_PROMPT_TEMPLATE)
+
 
 GUILDELINES_PROMPT_TEMPLATE = """
 User Query:
@@ -92,4 +102,58 @@ Keep your response **clear, professional, and easy to understand**—as if you w
 """
 
 
-COMPARISON_PROMT= PromptTemplate.from_template(template=DISCREPANCY_DETECTION_PROMPT)
\ No newline at end of file
+COMPARISON_PROMT= PromptTemplate.from_template(template=DISCREPANCY_DETECTION_PROMPT)
+
+RESIDUAL_COMPARISON_PROMPT = """
+A Letter of Credit (LC) and an Invoice were extracted with Azure Document Intelligence and their key fields were already checked by deterministic rules.
+
+## **Field Check Results**
+{field_summary}
+
+The fields below could not be decided by the rules (ambiguous or not found). Judge only these, using the extracted data given for them:
+
+## **Fields To Review**
+{residual_fields}
+
+## **LC Values For These Fields**
+{lc_fields}
+
+## **Invoice Values For These Fields**
+{invoice_fields}
+
+Write a short assessment for a financial officer:
+1. For every field to review, say whether it matches, is a discrepancy, or cannot be verified, and why.
+2. Give a final verdict for the whole comparison that takes the field check results above as given.
+3. Recommend next steps if there is an issue.
+"""
+
+
+GROUP_COMPARISON_PROMPT = """
+Compare one part of a Letter of Credit (LC) with an Invoice, both extracted with Azure Document Intelligence.
+
+Part: {group}
+
+## **LC Fields**
+{lc_fields}
+
+## **Invoice Fields**
+{invoice_fields}
+
+List briefly, as bullet points, what matches and every discrepancy in this part only, and say how serious each discrepancy is. If this part has nothing to compare, say so in one line.
+"""
+
+
+REDUCE_COMPARISON_PROMPT = """
+A Letter of Credit (LC) and an Invoice were compared part by part. Merge the findings into one assessment.
+
+## **Field Check Results**
+{field_summary}
+
+## **Findings Per Part**
+{group_findings}
+
+Write for a financial officer who needs to approve the invoice:
+1. Overall matching summary in plain language.
+2. The important concerns only, with why they matter.
+3. A final verdict with a confidence level and the next steps if there is an issue.
+"""
@@ -1,13 +1,47 @@
 from langchain_community.vectorstores import Qdrant
-import logging 
+from qdrant_client.http import models as qdrant_models
+from .bm25_index import BM25Index
+import logging
 import traceback
+import hashlib
+import threading
+import uuid
+
+
+class LockedClient():
+    """
+    Qdrant client wrapper that runs every client call under the session lock.
+
+    The in-memory QdrantLocal client is not thread safe, and query threads search it (through
+    `search_groups` or the LangChain retrievers) while ingestion upserts and deletes points.
+    """
+
+    def __init__(self, client, lock):
+        self.client = client
+        self.lock = lock
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attribute(*args, **kwargs)
+        return locked
+
 
 class Qdrant_DB():
     """
     Manages the storage and uploading of document vectors to a Qdrant database.
 
-    This class is responsible for connecting to a Qdrant vector database, uploading document 
+    This class is responsible for connecting to a Qdrant vector database, uploading document
     vectors using a specified embedding model, and maintaining the collection within the Qdrant DB.
+    One instance is kept per user session, so the collection is created once and new files are
+    appended to it instead of re-embedding everything that was uploaded before.
+    The session's BM25 index is kept in step with the collection. Searches and writes of the
+    collection share one lock; chunks are embedded before it is taken, so searches only wait
+    for the upsert itself.
     """
 
     def __init__(self,embedding_model, collection_name):
@@ -15,38 +49,155 @@ class Qdrant_DB():
         self.embedding_model = embedding_model
         self.collection_name = collection_name
         self.vector_store = None
-        self.documents = None
+        self.stored_documents = {}
+        self.bm25_index = BM25Index()
+        self.lock = threading.RLock()
+
+    @property
+    def documents(self) -> list:
+        """
+        All documents currently stored in the collection, in upload order.
+        """
+        return list(self.stored_documents.values())
+
+    def document_ids(self,documents) -> list:
+        """
+        Builds deterministic point ids for a list of documents.
+
+        Parameters:
+        - documents (List[Document]): Documents to generate ids for.
 
+        Returns:
+        - list: One UUID string per document, derived from its file name, page, position in the
+          page and content, so ids do not depend on how a file is batched.
+        """
+        ids = []
+        positions = {}
+        for document in documents:
+            file_name = document.metadata.get("file_name")
+            page_number = document.metadata.get("page_number")
+            position = positions.get((file_name, page_number), 0)
+            positions[(file_name, page_number)] = position + 1
+            digest = hashlib.sha1(document.page_content.encode("utf-8")).hexdigest()
+            key = f"{file_name}:{page_number}:{position}:{digest}"
+            ids.append(str(uuid.uuid5(uuid.NAMESPACE_URL, key)))
+        return ids
 
     def upload_vectors(self,documents):
-        """    
+        """
         Uploads document vectors to the in-memory Qdrant database collection.
 
-        Processes a list of documents, generates embeddings using the assigned model, and 
-        uploads these vectors to a specified Qdrant collection.
+        Processes a list of documents, generates embeddings using the assigned model, and
+        uploads these vectors to a specified Qdrant collection. Kept for compatibility, it
+        simply appends the documents to the session collection.
+        """
+        return self.add_documents(documents)
+
+    def add_documents(self,documents) -> list:
+        """
+        Embeds and upserts only the given documents into the session collection.
+
+        The collection is created on the first call; later calls embed and insert the new
+        chunks only, so the cost of an upload depends on the size of the new file.
+
+        Parameters:
+        - documents (List[Document]): New chunks to embed and store.
+
+        Returns:
+        - list: The point ids of the upserted documents.
         """
         try:
-            logging.info("Uploading Vectors in Qdrant DB")
-            self.documents = documents
-            self.vector_store=Qdrant.from_documents(
-                    documents=documents,
-                    embedding=self.embedding_model, 
-                    location=":memory:",
-                    collection_name=self.collection_name,
-                    m = 100,
-                    ef_construction = 500
-                )
+            if not documents:
+                return []
+
+            logging.info(f"Upserting {len(documents)} Vectors in Qdrant DB")
+            ids = self.document_ids(documents)
+            vectors = None
+            if self.vector_store is not None:
+                vectors = self.embedding_model.embed_documents([document.page_content for document in documents])
+
+            with self.lock:
+                if self.vector_store is None:
+                    # Nothing can search the collection before it exists, so it is built in one go
+                    self.vector_store=Qdrant.from_documents(
+                            documents=documents,
+                            embedding=self.embedding_model,
+                            ids=ids,
+                            location=":memory:",
+                            collection_name=self.collection_name,
+                            m = 100,
+                            ef_construction = 500
+                        )
+                    self.vector_store.client = LockedClient(self.vector_store.client, self.lock)
+                else:
+                    if vectors is None:
+                        # Another first batch built the collection while this one waited for the lock
+                        vectors = self.embedding_model.embed_documents([document.page_content for document in documents])
+                    self.vector_store.client.upsert(
+                        collection_name=self.collection_name,
+                        points=[qdrant_models.PointStruct(
+                                    id=point_id,
+                                    vector=vector,
+                                    payload={self.vector_store.content_payload_key: document.page_content,
+                                             self.vector_store.metadata_payload_key: document.metadata})
+                                for point_id,vector,document in zip(ids,vectors,documents)]
+                    )
+
+                new_documents = [document for point_id,document in zip(ids,documents)
+                                 if point_id not in self.stored_documents]
+                for point_id,document in zip(ids,documents):
+                    self.stored_documents[point_id] = document
+                self.bm25_index.add_documents(new_documents)
 
             logging.info("Vectors Uploaded Successfully!")
+            return ids
 
         except Exception as e:
             error_msg = "Error While Uploading"
             logging.info(f" {error_msg} {e} trace_back:{traceback.format_exc()}")
             raise Exception (f"{error_msg}{e} ")
 
+    def delete_file(self,file_name) -> int:
+        """
+        Deletes every vector that belongs to a file from the session collection.
+
+        Parameters:
+        - file_name (str): The file name stored in the documents' metadata.
+
+        Returns:
+        - int: Number of documents removed.
+        """
+        try:
+            with self.lock:
+                removed = [point_id for point_id,document in self.stored_documents.items()
+                           if document.metadata.get("file_name") == file_name]
+                if not removed:
+                    return 0
+
+                logging.info(f"Deleting Vectors of {file_name} from Qdrant DB")
+                self.vector_store.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=qdrant_models.FilterSelector(
+                        filter=qdrant_models.Filter(must=[
+                            qdrant_models.FieldCondition(
+                                key="metadata.file_name",
+                                match=qdrant_models.MatchValue(value=file_name)
+                            )
+                        ])
+                    )
+                )
+                for point_id in removed:
+                    del self.stored_documents[point_id]
+                self.bm25_index.remove_file(file_name)
+
+                return len(removed)
+
+        except Exception as e:
+            error_msg = "Error While Deleting"
+            logging.error(f" {error_msg} {e} trace_back:{traceback.format_exc()}")
+            raise Exception (f"{error_msg}{e} ")
 
 
-        
     def __del__(self):
         if self.vector_store:
-            self.vector_store = None
\ No newline at end of file
+            self.vector_store = None
@@ -0,0 +1,209 @@
+from html.parser import HTMLParser
+from .prompt_compaction import count_tokens
+import logging
+import os
+import re
+from dotenv import load_dotenv
+load_dotenv()
+
+# Query driven pruning of the rows and columns of reference tables in the QA prompt
+TABLE_PRUNING = os.getenv("TABLE_PRUNING", "true").lower() == "true"
+# Tables with fewer rows or columns are always sent whole
+PRUNE_MIN_ROWS = int(os.getenv("TABLE_PRUNE_MIN_ROWS", "8"))
+PRUNE_MIN_COLUMNS = int(os.getenv("TABLE_PRUNE_MIN_COLUMNS", "5"))
+
+STOP_WORDS = {"the", "and", "for", "are", "was", "what", "which", "who", "whom", "whose", "when", "where", "why",
+              "how", "this", "that", "these", "those", "with", "from", "into", "does", "did", "has", "have",
+              "any", "all", "per", "its", "there", "their", "table", "give", "show", "tell", "list", "please"}
+
+
+class TableParser(HTMLParser):
+    """
+    Reads the cells of an HTML table into rows, repeating the text of a cell over the rows and
+    columns it spans so every row has one value per column.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.row = None
+        self.cell = None
+        self.span = (1, 1)
+        self.pending = {}
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self.row = []
+        elif tag in ("td", "th") and self.row is not None:
+            attrs = dict(attrs)
+            self.cell = []
+            self.span = (int(attrs.get("rowspan") or 1), int(attrs.get("colspan") or 1))
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self.cell is not None:
+            self.fill_pending()
+            text = " ".join("".join(self.cell).split())
+            rowspan, colspan = self.span
+            for _ in range(colspan):
+                column = len(self.row)
+                self.row.append(text)
+                if rowspan > 1:
+                    self.pending[column] = (rowspan - 1, text)
+            self.cell = None
+        elif tag == "tr" and self.row is not None:
+            self.fill_pending(last=True)
+            self.rows.append(self.row)
+            self.row = None
+
+    def fill_pending(self, last=False):
+        # Cells spanning down from previous rows take their place before the next cell of this
+        # row, and at the end of the row all of them do
+        while len(self.row) in self.pending or (last and any(column >= len(self.row) for column in self.pending)):
+            column = len(self.row)
+            if column not in self.pending:
+                self.row.append("")
+                continue
+            remaining, text = self.pending[column]
+            self.row.append(text)
+            if remaining > 1:
+                self.pending[column] = (remaining - 1, text)
+            else:
+                del self.pending[column]
+
+
+def parse_html_table(html) -> list:
+    """
+    Parses an HTML table into rows of cell texts.
+
+    Parameters:
+    - html (str): The table HTML, as unstructured's `text_as_html` or `table_to_html`.
+
+    Returns:
+    - list: One list of strings per row, padded to the widest row.
+    """
+    parser = TableParser()
+    parser.feed(html)
+    parser.close()
+    rows = [row for row in parser.rows if any(row)]
+    width = max((len(row) for row in rows), default=0)
+    return [row + [""] * (width - len(row)) for row in rows]
+
+
+def render_rows(rows) -> str:
+    """
+    Writes rows as " | " separated lines, the first line being the header.
+    """
+    return "\n".join(" | ".join(cell.replace("|", "/") for cell in row) for row in rows)
+
+
+def compact_tables(html_tables, file_name=None, page_number=None) -> list:
+    """
+    Converts the HTML tables of a page to rows once at ingest, and logs how many tokens the
+    compact form saves for each table.
+
+    Parameters:
+    - html_tables (list): Table HTML strings of the page.
+    - file_name (str): The file of the page, for the log.
+    - page_number (int): The page number, for the log.
+
+    Returns:
+    - list: One {"rows", "html_tokens", "tokens"} dict per non-empty table.
+    """
+    tables = []
+    for position, html in enumerate(html_tables, start=1):
+        rows = parse_html_table(html)
+        if not rows:
+            continue
+
+        html_tokens = count_tokens(html)
+        tokens = count_tokens(render_rows(rows))
+        tables.append({"rows": rows, "html_tokens": html_tokens, "tokens": tokens})
+        logging.info(f"Table {position} of {file_name} page {page_number}: {len(rows)}x{len(rows[0])}, "
+                     f"{html_tokens} HTML tokens -> {tokens} tokens "
+                     f"({1 - tokens / html_tokens if html_tokens else 0:.0%} smaller)")
+    return tables
+
+
+def query_terms(query) -> set:
+    return {term for term in re.findall(r"\w+", query.lower()) if len(term) > 2 and term not in STOP_WORDS}
+
+
+def matches(text, terms) -> bool:
+    words = set(re.findall(r"\w+", text.lower()))
+    return bool(words & terms)
+
+
+def prune_rows(rows, terms) -> list:
+    """
+    Keeps the header, the first column and, when the query names some of them, only the
+    matching rows and columns of a large table; columns that are empty in every kept row are
+    dropped. A table the query does not match at all is kept whole.
+
+    Parameters:
+    - rows (list): Table rows, the first one being the header.
+    - terms (set): Query terms from `query_terms`.
+
+    Returns:
+    - list: The pruned rows.
+    """
+    header, body = rows[0], rows[1:]
+
+    if terms and len(body) >= PRUNE_MIN_ROWS:
+        kept = [row for row in body if any(matches(cell, terms) for cell in row)]
+        if kept:
+            body = kept
+
+    columns = list(range(len(header)))
+    if terms and len(columns) >= PRUNE_MIN_COLUMNS:
+        named = [column for column in columns[1:] if matches(header[column], terms)]
+        if named:
+            columns = [0] + named
+
+    columns = [column for column in columns if header[column] or any(row[column] for row in body)]
+    return [[row[column] for column in columns] for row in [header] + body]
+
+
+def table_rows(table) -> list:
+    """
+    The rows of the tables of a reference table entry; entries stored before the compact form
+    existed still carry `table_html` and are parsed here.
+    """
+    if "tables" in table:
+        return [compact["rows"] for compact in table["tables"]]
+    return [rows for html_list in table.get("table_html", []) for html in html_list
+            for rows in [parse_html_table(html)] if rows]
+
+
+def render_table(table, query=None) -> str:
+    """
+    Renders a reference table entry for the QA prompt, with its file name and page above
+    each table and the rows pruned by the query terms when TABLE_PRUNING is on.
+
+    Parameters:
+    - table (dict): A table index entry.
+    - query (str): The user question.
+
+    Returns:
+    - str: The rendered tables of the page.
+    """
+    terms = query_terms(query) if query and TABLE_PRUNING else set()
+    rendered = []
+    for position, rows in enumerate(table_rows(table), start=1):
+        rendered.append(f"[{table['file_name']}, page {table['page_number']}, table {position}]\n"
+                        f"{render_rows(prune_rows(rows, terms))}")
+    return "\n\n".join(rendered)
+
+
+def get_table_stats(tables) -> dict:
+    """
+    Totals the HTML and compact token counts of table index entries.
+    """
+    tables = [compact for table in tables for compact in table.get("tables", [])]
+    html_tokens = sum(compact["html_tokens"] for compact in tables)
+    tokens = sum(compact["tokens"] for compact in tables)
+    return {"tables": len(tables), "html_tokens": html_tokens, "tokens": tokens,
+            "reduction": 1 - tokens / html_tokens if html_tokens else 0.0}
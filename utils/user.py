@@ -3,4 +3,5 @@ USER_FILES = {}
 USER_FILTER_FILES = {}
 GUIDELINES={}
 TABULAR_DATA={}
-PROCESSED_DATA = {}
\ No newline at end of file
+PROCESSED_DATA = {}
+COMPARISONS = {}
\ No newline at end of file